@@ -0,0 +1,207 @@
+"""
+Classification of the likelihood that a publication is associated with NIF from
+references to the facility's instruments in its content
+"""
+import re
+import json
+import hashlib
+from functools import lru_cache
+from app import app
+from app.content_store import content_store
+from app.exceptions import NifReportingException
+from app.utils.processes import process_pool
+from app.constants import (
+    POSSIBLE_NIF_ASSOC, PROBABLE_NIF_ASSOC, UNLIKELY_NIF_ASSOC)
+
+# Regular expressions matching references to each type of term searched for
+DEFAULT_RULES = {
+    'mri': [r'MRI', r'(?:M|m)agnetic\s+(?:R|r)esonance\s+(?:I|i)maging'],
+    'ge': [r'(?<!\w)(?:GE|G.E.|(?:G|g)eneral\s+(?:E|e)lectric)(?!\w)']}
+
+# Rules that `classify` decides the likelihood of association from (references
+# to MRI are possibly associated, and probably if GE is also referenced), which
+# any rules configured with the NIF_ASSOC_RULES config option need to define
+REQUIRED_RULES = ('mri', 'ge')
+
+# Number of characters of context to include either side of each match
+CONTEXT_WIDTH = 50
+
+# Should be incremented whenever the classification logic changes so that
+# previously classified publications are rescanned
+CLASSIFIER_VERSION = 2
+
+
+class Scanner():
+    """
+    Matches a set of terms against a document in a single pass by combining them
+    into one compiled alternation with a named group per rule. Context snippets
+    are then sliced out of the document by offset, rather than being matched as
+    part of the pattern (which causes heavy backtracking on large documents).
+
+    The context of each match is limited to the line it is on, as the stored
+    text has one line per paragraph/block (unlike the original
+    `.{50}<term>.{50}` patterns, matches near the edges of a block are
+    counted with whatever context there is), and matches of the same rule with
+    overlapping context are merged.
+
+    Parameters
+    ----------
+    rules : dict[str, list[str]]
+        Regular expressions matching the terms of each rule
+    context : int
+        The number of characters of context either side of a match
+    """
+
+    def __init__(self, rules, context=CONTEXT_WIDTH):
+        self.rules = rules
+        self.context = context
+        self.regex = re.compile('|'.join(
+            '(?P<{}>{})'.format(name, '|'.join(terms))
+            for name, terms in rules.items()))
+
+    @property
+    def version(self):
+        """
+        Identifier of the rule set, which changes whenever the rules, context
+        width or classifier version change
+        """
+        spec = json.dumps([CLASSIFIER_VERSION, self.context, self.rules],
+                          sort_keys=True)
+        return hashlib.sha256(spec.encode('utf-8')).hexdigest()[:16]
+
+    def scan(self, text):
+        """
+        Find the matches of each rule in the text
+
+        Parameters
+        ----------
+        text : str
+            The text to scan
+
+        Returns
+        -------
+        dict[str, list[str]]
+            Context snippets of the matches of each rule
+        """
+        snippets = {name: [] for name in self.rules}
+        last_end = {name: 0 for name in self.rules}
+        ctx = self.context
+        for match in self.regex.finditer(text):
+            name = match.lastgroup
+            start = max(match.start() - ctx,
+                        text.rfind('\n', 0, match.start()) + 1)
+            if start < last_end[name]:
+                continue
+            line_end = text.find('\n', match.end())
+            if line_end == -1:
+                line_end = len(text)
+            end = min(match.end() + ctx, line_end)
+            snippets[name].append(text[start:end])
+            last_end[name] = end
+        return snippets
+
+
+@lru_cache()
+def default_scanner():
+    """
+    Scanner for the rules in the NIF_ASSOC_RULES config option (DEFAULT_RULES
+    if not set)
+
+    Raises
+    ------
+    NifReportingException
+        If the configured rules don't define all of the REQUIRED_RULES
+    """
+    rules = app.config.get('NIF_ASSOC_RULES', DEFAULT_RULES)
+    missing = [name for name in REQUIRED_RULES if name not in rules]
+    if missing:
+        raise NifReportingException(
+            "NIF_ASSOC_RULES is missing the required rules: {}".format(
+                ', '.join(missing)))
+    return Scanner(rules)
+
+
+def classify(content, scanner=None):
+    """
+    Guess the likelihood the publication is associated with NIF from its
+    content
+
+    Parameters
+    ----------
+    content : str
+        The content of the publication
+    scanner : Scanner or None
+        The scanner used to match the terms (which must include the
+        REQUIRED_RULES), the default scanner if None
+
+    Returns
+    -------
+    likelihood : int
+        The NIF association constant
+    matches : dict[str, list[str]]
+        The context snippets of the matches of each rule
+    """
+    if scanner is None:
+        scanner = default_scanner()
+    matches = scanner.scan(content)
+    if matches['mri']:
+        if matches['ge']:
+            likelihood = PROBABLE_NIF_ASSOC
+        else:
+            likelihood = POSSIBLE_NIF_ASSOC
+    else:
+        likelihood = UNLIKELY_NIF_ASSOC
+    return likelihood, matches
+
+
+def classify_stored(item):
+    """
+    Classify the content of a publication read from the content store. Only
+    takes and returns picklable values so that it can be run in a worker
+    process
+
+    Parameters
+    ----------
+    item : tuple[int, str]
+        The ID of the publication and the key of its content in the store
+
+    Returns
+    -------
+    tuple[int, int or None, dict[str, list[str]] or None, str or None]
+        The ID of the publication, its likelihood of association, the snippets
+        matched for each rule and the checksum of the content (None if content
+        wasn't found)
+    """
+    pub_id, content_key = item
+    content = content_store().read(content_key)
+    if content is None:
+        return pub_id, None, None, None
+    likelihood, matches = classify(content)
+    checksum = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    return pub_id, likelihood, matches, checksum
+
+
+def classify_stored_many(items, jobs=1, chunksize=16):
+    """
+    Classify the content of many publications, in parallel over a pool of
+    worker processes if `jobs` > 1
+
+    Parameters
+    ----------
+    items : iterable[tuple[int, str]]
+        The IDs of the publications and the keys of their content in the store
+    jobs : int
+        The number of worker processes
+    chunksize : int
+        The number of items sent to a worker at a time
+
+    Yields
+    ------
+    tuple[int, int or None, dict[str, list[str]] or None, str or None]
+        The results of `classify_stored` for each item (in the order given)
+    """
+    if jobs <= 1:
+        yield from map(classify_stored, items)
+        return
+    with process_pool(jobs) as executor:
+        yield from executor.map(classify_stored, items, chunksize=chunksize)
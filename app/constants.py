@@ -54,3 +54,11 @@ NIF_ASSOC = {
         'Highly probable',
         'Higly probable to be associated with NIF. Manually checked but '),
     DEFINITE_NIF_ASSOC: ('Definite', 'Definitely associated with NIF')}
+
+
+FAILED_RUN_ITEM = 0
+COMPLETED_RUN_ITEM = 1
+
+RUN_ITEM_STATUS = {
+    FAILED_RUN_ITEM: ('Failed', 'Failed, to be retried when the run is resumed'),
+    COMPLETED_RUN_ITEM: ('Completed', 'Completed, skipped when the run is resumed')}
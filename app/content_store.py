@@ -0,0 +1,192 @@
+"""
+Storage backends for the downloaded full-text content of publications
+"""
+import os
+import os.path
+import gzip
+import hashlib
+from functools import lru_cache
+from app import app, PKG_DIR
+from app.exceptions import NifReportingException
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class ContentStore():
+    """
+    Base class of content stores, which map keys (e.g. '<scopus-id>.html') to
+    text content
+    """
+
+    def read(self, key):
+        raise NotImplementedError
+
+    def write(self, key, content):
+        raise NotImplementedError
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def keys(self):
+        raise NotImplementedError
+
+    def path(self, key):
+        """
+        Path to the file the content is stored in
+        """
+        raise NotImplementedError
+
+
+class FileContentStore(ContentStore):
+    """
+    Stores each content item as an uncompressed file named by its key in a flat
+    directory (the original layout of the 'publication-content' directory)
+
+    Parameters
+    ----------
+    base_dir : str
+        The directory to store the content in
+    """
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+
+    def path(self, key):
+        return os.path.join(self.base_dir, key)
+
+    def read(self, key):
+        try:
+            with open(self.path(key), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, key, content):
+        os.makedirs(self.base_dir, exist_ok=True)
+        with open(self.path(key), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def keys(self):
+        with os.scandir(self.base_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    yield entry.name
+
+
+class CompressedContentStore(ContentStore):
+    """
+    Stores each content item as a compressed file in a directory sharded by the
+    hash of its key, so no one directory grows too large to scan
+
+    Parameters
+    ----------
+    base_dir : str
+        The directory to store the content in
+    codec : str
+        The compression codec to use, either 'gzip' or 'zstd' (requires the
+        'zstandard' package)
+    level : int or None
+        The compression level, the default of the codec if None
+    """
+
+    EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+    def __init__(self, base_dir, codec='gzip', level=None):
+        if codec not in self.EXTENSIONS:
+            raise NifReportingException(
+                "Unrecognised compression codec '{}'".format(codec))
+        if codec == 'zstd' and zstandard is None:
+            raise NifReportingException(
+                "'zstandard' package is required to use 'zstd' codec")
+        self.base_dir = base_dir
+        self.codec = codec
+        self.level = level
+
+    def path(self, key):
+        shard = hashlib.sha1(key.encode('utf-8')).hexdigest()[:2]
+        return os.path.join(self.base_dir, shard,
+                            key + self.EXTENSIONS[self.codec])
+
+    def read(self, key):
+        try:
+            with open(self.path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        return self.decompress(data).decode('utf-8')
+
+    def write(self, key, content):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so that readers never see a partially
+        # written item
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.compress(content.encode('utf-8')))
+        os.replace(tmp_path, path)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def keys(self):
+        ext = self.EXTENSIONS[self.codec]
+        with os.scandir(self.base_dir) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(ext):
+                            yield entry.name[:-len(ext)]
+
+    def compress(self, data):
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(
+                level=(self.level if self.level is not None else 3)).compress(data)
+        return gzip.compress(
+            data, compresslevel=(self.level if self.level is not None else 6))
+
+    def decompress(self, data):
+        if self.codec == 'zstd':
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+
+def create_content_store(backend, base_dir, **kwargs):
+    """
+    Create a content store from the name of its backend
+
+    Parameters
+    ----------
+    backend : str
+        Either 'file' (uncompressed flat directory), 'gzip' or 'zstd'
+        (compressed sharded directory)
+    base_dir : str
+        The directory to store the content in
+    **kwargs
+        Passed to the content store
+    """
+    if backend == 'file':
+        return FileContentStore(base_dir)
+    if backend in CompressedContentStore.EXTENSIONS:
+        return CompressedContentStore(base_dir, codec=backend, **kwargs)
+    raise NifReportingException(
+        "Unrecognised content store backend '{}'".format(backend))
+
+
+@lru_cache()
+def content_store():
+    """
+    The content store configured by the CONTENT_STORE and CONTENT_DIR config
+    options
+    """
+    return create_content_store(
+        app.config.get('CONTENT_STORE', 'file'),
+        app.config.get('CONTENT_DIR',
+                       os.path.join(PKG_DIR, 'publication-content')))
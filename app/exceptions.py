@@ -1,5 +1,18 @@
 class NifReportingException(Exception):
     pass
 
+
 class UnsupportedDatabaseEngineError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class ContentTooLargeError(NifReportingException):
+    pass
+
+
+class AccessBlockedError(NifReportingException):
+    pass
+
+
+class InvalidScopusQueryError(NifReportingException):
+    pass
@@ -0,0 +1,167 @@
+"""
+Export of the publications database to typed, columnar Parquet files for
+downstream analytics
+"""
+import os
+import os.path
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import select, types
+from app import db
+from app.models import (
+    Publication, ScopusAuthor, Affiliation, Researcher,
+    scopusauthor_publication_assoc)
+from app.reports import STREAM_BATCH_SIZE
+
+ARROW_TYPES = [
+    (types.Boolean, pa.bool_()),
+    (types.Integer, pa.int64()),
+    (types.DateTime, pa.timestamp('us')),
+    (types.Date, pa.date32()),
+    (types.Float, pa.float64()),
+    (types.String, pa.string())]  # also matches Text
+
+# Tables exported alongside the partitioned publications
+OTHER_TABLES = [ScopusAuthor.__table__, Affiliation.__table__,
+                Researcher.__table__, scopusauthor_publication_assoc]
+
+
+def arrow_schema(table):
+    """
+    Map the columns of a database table onto an Arrow schema
+
+    Parameters
+    ----------
+    table : sqlalchemy.Table
+        The table to create the schema for
+
+    Returns
+    -------
+    pyarrow.Schema
+        The schema
+    """
+    fields = []
+    for column in table.columns:
+        for sql_type, arrow_type in ARROW_TYPES:
+            if isinstance(column.type, sql_type):
+                fields.append(pa.field(column.name, arrow_type))
+                break
+        else:
+            fields.append(pa.field(column.name, pa.string()))
+    return pa.schema(fields)
+
+
+def iter_batches(table, schema, batch_size=STREAM_BATCH_SIZE, order_by=None):
+    """
+    Stream the rows of a table into Arrow record batches
+    """
+    query = select(table)
+    if order_by is not None:
+        query = query.order_by(order_by)
+    result = db.session.execute(
+        query.execution_options(stream_results=True))
+    for rows in result.mappings().partitions(batch_size):
+        yield pa.RecordBatch.from_pylist([dict(r) for r in rows], schema=schema)
+
+
+def export_table(table, path, batch_size=STREAM_BATCH_SIZE):
+    """
+    Export a table to a single Parquet file
+    """
+    schema = arrow_schema(table)
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in iter_batches(table, schema, batch_size=batch_size):
+            writer.write_batch(batch)
+
+
+def export_publications(base_dir, batch_size=STREAM_BATCH_SIZE):
+    """
+    Export the publications table partitioned by year into a Hive-style
+    directory layout (i.e. 'year=2023/part-0.parquet') so that filters on the
+    year are pushed down to the partitions read
+
+    Parameters
+    ----------
+    base_dir : str
+        The directory to write the partitions to
+    batch_size : int
+        The number of rows read from the database at a time
+    """
+    table = Publication.__table__
+    schema = arrow_schema(table)
+    writers = {}
+    try:
+        for batch in iter_batches(table, schema, batch_size=batch_size,
+                                  order_by=table.c.date):
+            years = pc.year(batch.column('date')).to_pylist()
+            for year in sorted(set(years), key=lambda y: (y is None, y)):
+                mask = pa.array([y == year for y in years])
+                if year not in writers:
+                    part_dir = os.path.join(
+                        base_dir, 'year={}'.format(
+                            year if year is not None
+                            else '__HIVE_DEFAULT_PARTITION__'))
+                    os.makedirs(part_dir, exist_ok=True)
+                    writers[year] = pq.ParquetWriter(
+                        os.path.join(part_dir, 'part-0.parquet'), schema)
+                writers[year].write_batch(batch.filter(mask))
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+
+def export_parquet(output_dir, batch_size=STREAM_BATCH_SIZE):
+    """
+    Export the publications (partitioned by year), Scopus authors, affiliations,
+    researchers and the links between authors and publications to Parquet
+
+    Parameters
+    ----------
+    output_dir : str
+        The directory to write the Parquet files to
+    batch_size : int
+        The number of rows read from the database at a time
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    export_publications(os.path.join(output_dir, Publication.__tablename__),
+                        batch_size=batch_size)
+    for table in OTHER_TABLES:
+        export_table(table, os.path.join(output_dir, table.name + '.parquet'),
+                     batch_size=batch_size)
+
+
+def flatten_author_affiliations(table, column='AuthorAffIDList',
+                                separator='_||_'):
+    """
+    Flatten a table of authors of publications with a delimited list of
+    affiliation IDs per author into one row per author and affiliation, as
+    produced by the harvesting scripts (e.g. '#EID_AUTHORS_wAFIDstring.csv')
+
+    Parameters
+    ----------
+    table : pyarrow.Table
+        The authors table, e.g. read with pyarrow.csv.read_csv
+    column : str
+        The column containing the delimited affiliation IDs
+    separator : str
+        The delimiter between the affiliation IDs
+
+    Returns
+    -------
+    pyarrow.Table
+        The flattened table, with the same columns and the rows in the order
+        of the authors they were split from. Authors without a list of
+        affiliations (or with a single one) are kept as a single row
+    """
+    values = table.column(column).cast(pa.string())
+    splits = pc.split_pattern(pc.fill_null(values, ''), separator)
+    parents = pc.list_parent_indices(splits)
+    flattened = table.take(parents)
+    affiliations = pc.list_flatten(splits)
+    # Authors without any affiliation data keep a null rather than ''
+    affiliations = pc.if_else(pc.is_null(flattened.column(column)),
+                              pa.nulls(len(affiliations), pa.string()),
+                              affiliations)
+    return flattened.set_column(table.schema.get_field_index(column),
+                                pa.field(column, pa.string()), affiliations)
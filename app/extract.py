@@ -0,0 +1,220 @@
+"""
+Extraction of the plain text of articles from the HTML pages downloaded from
+publishers, so that only the text of the article (rather than the scripts,
+styles, navigation and markup of the page) is stored and scanned, and
+verification that pages are of the expected article
+"""
+import re
+from lxml import etree
+import lxml.html
+
+try:
+    from rapidfuzz import fuzz
+except ImportError:
+    from fuzzywuzzy import fuzz
+
+# Elements that never contain article text (<form> and <header> aren't among
+# them, as some publishers wrap the whole page in a form and headers often hold
+# the title and abstract of the article)
+BOILERPLATE_TAGS = ('head', 'script', 'style', 'noscript', 'template', 'iframe',
+                    'svg', 'canvas', 'button', 'select', 'nav', 'footer',
+                    'aside', etree.ProcessingInstruction)
+
+# Hidden elements and the page furniture around the article marked up with
+# ARIA roles
+BOILERPLATE_XPATH = '//*[@aria-hidden="true" or {}]'.format(' or '.join(
+    '@role="{}"'.format(role) for role in (
+        'navigation', 'banner', 'contentinfo', 'complementary', 'search',
+        'dialog')))
+
+# Elements that are rendered on their own lines
+BLOCK_TAGS = ('address', 'article', 'blockquote', 'br', 'caption', 'dd', 'div',
+              'dl', 'dt', 'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4', 'h5',
+              'h6', 'hr', 'li', 'main', 'ol', 'p', 'pre', 'section', 'table',
+              'td', 'th', 'tr', 'ul')
+
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+
+# Containers of the article body, in order of preference
+BODY_XPATHS = ('//article', '//main', '//*[@role="main"]')
+
+METHODS_HEADING = re.compile(
+    r'^\s*(?:[\dIVX]+(?:\.\d+)*\.?\s+)?(?:star\s*\W?\s*)?'
+    r'(?:materials?\s+(?:and|&)\s+methods|methods?(?:\s+(?:and|&)\s+materials?)?'
+    r'|methodology|experimental\s+(?:procedures?|methods|section)'
+    r'|online\s+methods|subjects\s+and\s+methods)\s*$',
+    re.IGNORECASE)
+
+# Elements and meta tags that hold the title of the article on publisher pages
+TITLE_XPATHS = ('//meta[@name="citation_title" or @name="dc.title" '
+                'or @name="DC.title" or @property="og:title"]/@content',
+                '//title', '//h1')
+
+# Maximum number of elements compared to the title, so the cost of verifying a
+# page doesn't grow with its size
+MAX_TITLE_CANDIDATES = 20
+
+# Minimum token set similarity (0-100) between the title of the publication and
+# one of the candidate titles on the page
+TITLE_MATCH_THRESHOLD = 80
+
+_WHITESPACE = re.compile(r'[^\S\n]+')
+_NON_ALPHANUMERIC = re.compile(r'[\W_]+')
+
+
+def parse_html(html):
+    """
+    Parse an HTML page
+
+    Parameters
+    ----------
+    html : str or bytes
+        The HTML of the page
+
+    Returns
+    -------
+    lxml.html.HtmlElement or None
+        The root of the document, None if it is empty
+    """
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+        parser = lxml.html.HTMLParser(encoding='utf-8', remove_comments=True)
+    else:
+        parser = lxml.html.HTMLParser(remove_comments=True)
+    try:
+        return lxml.html.document_fromstring(html, parser=parser)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def title_candidates(root):
+    """
+    Yield the texts on the page likely to be the title of the article, i.e. the
+    citation meta tags, <title> and <h1> elements
+    """
+    num_candidates = 0
+    for xpath in TITLE_XPATHS:
+        for node in root.xpath(xpath):
+            text = node if isinstance(node, str) else node.text_content()
+            yield text
+            num_candidates += 1
+            if num_candidates == MAX_TITLE_CANDIDATES:
+                return
+
+
+def title_matches(root, title, threshold=TITLE_MATCH_THRESHOLD):
+    """
+    Whether a page is of the article with the given title, stopping at the first
+    candidate title on the page that matches
+
+    Parameters
+    ----------
+    root : lxml.html.HtmlElement
+        The root of the page
+    title : str
+        The title of the publication
+    threshold : int
+        The minimum token set similarity for a match
+
+    Returns
+    -------
+    bool
+        Whether one of the candidate titles matches
+    """
+    title = _simplify(title)
+    for candidate in title_candidates(root):
+        candidate = _simplify(candidate)
+        # Short candidates (e.g. 'Abstract') would match any title containing
+        # them on the token set similarity alone
+        if (len(candidate) >= len(title) // 2
+                and fuzz.token_set_ratio(title, candidate) >= threshold):
+            return True
+    return False
+
+
+def html_to_text(html):
+    """
+    Extract the text of the body of an article (along with its Methods section
+    if it is laid out outside of the main body) from its HTML page
+
+    Parameters
+    ----------
+    html : str or bytes
+        The HTML of the page
+
+    Returns
+    -------
+    str
+        The text of the article, with one line per paragraph/block element
+    """
+    root = parse_html(html)
+    if root is None:
+        return ''
+    etree.strip_elements(root, *BOILERPLATE_TAGS, with_tail=False)
+    for elem in root.xpath(BOILERPLATE_XPATH):
+        if elem.getparent() is not None:
+            elem.drop_tree()
+    # Separate the text of block elements by newlines
+    for elem in root.iter(*BLOCK_TAGS):
+        elem.tail = '\n' + (elem.tail or '')
+        if elem.tag != 'br':
+            elem.text = '\n' + (elem.text or '')
+
+    body = _article_body(root)
+    text = body.text_content()
+    if _methods_heading(body) is None:
+        text += ''.join(e.text_content() for e in _methods_section(root))
+    return _normalise(text)
+
+
+def _article_body(root):
+    body = root.find('body')
+    if body is None:
+        body = root
+    # The largest of the main content containers, as long as it holds a
+    # reasonable share of the page (pages sometimes wrap only the abstract or a
+    # teaser of related articles in <article>)
+    page_length = len(body.text_content())
+    candidates = [e for xpath in BODY_XPATHS for e in root.xpath(xpath)]
+    if candidates:
+        best = max(candidates, key=lambda e: len(e.text_content()))
+        if len(best.text_content()) >= 0.25 * page_length:
+            return best
+    return body
+
+
+def _methods_heading(elem):
+    for heading in elem.iter(*HEADING_TAGS):
+        if METHODS_HEADING.match(heading.text_content()):
+            return heading
+    return None
+
+
+def _methods_section(root):
+    """
+    Find the elements making up the Methods section, i.e. the <section>
+    introduced by the Methods heading, or otherwise the heading and its
+    following siblings up to the next heading of the same or higher level
+    """
+    heading = _methods_heading(root)
+    if heading is None:
+        return []
+    parent = heading.getparent()
+    if (parent is not None and parent.tag == 'section'
+            and next(parent.iter(*HEADING_TAGS)) is heading):
+        return [parent]
+    elems = [heading]
+    for sibling in heading.itersiblings():
+        if sibling.tag in HEADING_TAGS and sibling.tag <= heading.tag:
+            break
+        elems.append(sibling)
+    return elems
+
+
+def _simplify(text):
+    return _NON_ALPHANUMERIC.sub(' ', text).strip().lower()
+
+
+def _normalise(text):
+    lines = (_WHITESPACE.sub(' ', line).strip() for line in text.split('\n'))
+    return '\n'.join(line for line in lines if line)
@@ -0,0 +1,528 @@
+"""
+Functions to download the full text content of publications
+"""
+import os.path
+import tempfile
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from urllib.parse import unquote as unquote_url, urljoin, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from urllib3.util.retry import Retry
+from app import app, PKG_DIR
+from app.scopus import api_key, elsevier_limiter
+from app.utils.http_cache import HttpCache
+from app.extract import parse_html, html_to_text, title_matches
+from app.pdf import spool_response, pdf_text, start_pdf_pool
+from app.exceptions import ContentTooLargeError, AccessBlockedError
+from app.constants import (
+    CANT_ACCESS_CONTENT, PLAIN_TEXT_ACCESS_CONTENT, HTML_ACCESS_CONTENT,
+    PDF_ACCESS_CONTENT, UNKNOWN_ACCESS_CONTENT)
+
+logger = logging.getLogger(__name__)
+
+DOI_RESOLVER = "http://doi.org/"
+SCIENCE_DIRECT = "http://api.elsevier.com/content/article/pii/"
+CROSSREF = "https://api.wiley.com/onlinelibrary/tdm/v1/articles/"
+
+
+crossref_config = os.path.join(os.environ["HOME"], ".crossref", "config.json")
+
+USER_AGENT_HEADER = {
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/50.0.2661.102 Safari/537.36"
+    )
+}
+
+# Timeouts (connect, read) in seconds for all content requests
+REQUEST_TIMEOUT = (10, 120)
+
+# Maximum number of concurrent requests made to any one host
+MAX_REQUESTS_PER_HOST = 4
+
+FetchResult = namedtuple('FetchResult',
+                         ['key', 'access_status', 'content', 'error',
+                          'attempts'],
+                         defaults=(None, ()))
+
+# Attempt to download the content of a publication of a publisher with one of
+# the fetch strategies, which took `latency` seconds and either succeeded,
+# failed or was blocked
+FetchAttempt = namedtuple('FetchAttempt',
+                          ['publisher', 'strategy', 'outcome', 'latency'])
+
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+BLOCKED = 'blocked'
+
+if os.path.exists(crossref_config):
+    with open(crossref_config) as f:
+        crossref_token = json.load(f)["APIToken"]
+else:
+    crossref_token = None
+
+
+@lru_cache()
+def http_cache():
+    """
+    The HTTP response cache shared by the content downloaders
+    """
+    return HttpCache(
+        app.config.get("HTTP_CACHE_PATH",
+                       os.path.join(PKG_DIR, "http-cache.sqlite")),
+        ttl=app.config.get("HTTP_CACHE_TTL", 30 * 24 * 60 * 60),
+        max_size=app.config.get("HTTP_CACHE_MAX_SIZE", 2 * 1024 ** 3))
+
+
+@lru_cache()
+def session():
+    """
+    Session shared between the content downloaders so that connections to each
+    host are kept alive and reused. Failed requests are retried with
+    exponential backoff
+    """
+    retry = Retry(total=3, backoff_factor=1,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=MAX_REQUESTS_PER_HOST,
+                          max_retries=retry)
+    sess = requests.Session()
+    sess.mount("http://", adapter)
+    sess.mount("https://", adapter)
+    return sess
+
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+
+def host_semaphore(netloc):
+    """
+    The semaphore limiting the number of concurrent requests to a host, shared
+    between all the downloader threads
+    """
+    with _host_semaphores_lock:
+        try:
+            return _host_semaphores[netloc]
+        except KeyError:
+            semaphore = threading.BoundedSemaphore(MAX_REQUESTS_PER_HOST)
+            _host_semaphores[netloc] = semaphore
+            return semaphore
+
+
+def get(url, headers=None, limiter=None, **kwargs):
+    """
+    Get a URL via the response cache and shared session, limiting the number of
+    concurrent requests to each host
+
+    Parameters
+    ----------
+    url : str
+        The URL to get
+    headers : dict
+        Request headers
+    limiter : RateLimiter or RedisRateLimiter or None
+        Rate limiter to wait on before making a request over the network
+    **kwargs
+        Passed through to `requests.Session.get`
+
+    Returns
+    -------
+    requests.Response
+        The response
+    """
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    with host_semaphore(urlparse(url).netloc):
+        return http_cache().get(url, headers=headers, session=session(),
+                                limiter=limiter, **kwargs)
+
+
+def resolve_doi(doi):
+    """
+    Resolve a DOI to the URL of its page on the publisher's site. The resolver
+    is requested outside of the per-host limit, so that downloads via DOIs are
+    only limited by the hosts of the publishers they resolve to
+
+    Parameters
+    ----------
+    doi : str
+        The DOI
+
+    Returns
+    -------
+    str
+        The URL the DOI redirects to, or the URL of the DOI if it doesn't
+    """
+    url = DOI_RESOLVER + doi
+    response = http_cache().get(url, headers=USER_AGENT_HEADER,
+                                session=session(), allow_redirects=False,
+                                timeout=REQUEST_TIMEOUT)
+    if response.is_redirect:
+        return urljoin(url, response.headers["Location"])
+    return url
+
+
+def content_from_doi(doi, title=None):
+    # Pages that turn out not to be of the article (e.g. bot protection pages)
+    # are evicted from the response cache so that retries request them again
+    requests_made = [(DOI_RESOLVER + doi, USER_AGENT_HEADER)]
+    try:
+        url = resolve_doi(doi)
+        requests_made.append((url, USER_AGENT_HEADER))
+        response = get(url, headers=USER_AGENT_HEADER)
+    except RequestException:
+        return None
+    page = parse_html(response.text)
+    if page is not None:
+        redirect_url = page.xpath('string(//*[@id="redirectURL"]/@value)')
+        if redirect_url:
+            requests_made.append((unquote_url(redirect_url), None))
+            try:
+                response = get(unquote_url(redirect_url))
+            except RequestException:
+                return None
+            page = parse_html(response.text)
+    if page is None:
+        _evict(requests_made)
+        return None
+    if page.findtext('.//title', '').strip().startswith("Attention Required!"):
+        _evict(requests_made)
+        raise AccessBlockedError(
+            "Access to {} blocked by bot protection".format(response.url))
+    if title is not None and not title_matches(page, title):
+        _evict(requests_made)
+        return None
+    return response.text
+
+
+def _evict(requests_made):
+    for url, headers in requests_made:
+        http_cache().evict(url, headers=headers)
+
+
+def content_from_crossref(doi):
+    if crossref_token is None:
+        return None
+    url = CROSSREF + doi
+    # The PDF is spooled to disk rather than held in memory (or the response
+    # cache) and the extraction is run outside of the per-host limit
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as spool:
+        try:
+            with host_semaphore(urlparse(url).netloc), session().get(
+                    url,
+                    headers={
+                        "CR-Clickthrough-Client-Token": crossref_token,
+                        "Accept": "application/pdf",
+                    },
+                    timeout=REQUEST_TIMEOUT,
+                    stream=True) as response:
+                response.raise_for_status()
+                spool_response(response, spool)
+        except (RequestException, ContentTooLargeError) as e:
+            logger.info("Could not download PDF of %s: %s", doi, e)
+            return None
+        return pdf_text(spool.name) or None
+
+
+def content_from_pii(pii):
+    url = SCIENCE_DIRECT + pii
+    headers = {
+        "X-ELS-APIKey": api_key(),
+        "Accept": "application/json",
+    }
+    try:
+        response = get(url, headers=headers, limiter=elsevier_limiter("article"))
+    except RequestException:
+        return None
+    text = None
+    if response.ok:
+        try:
+            text = response.json()["full-text-retrieval-response"]["originalText"]
+        except (KeyError, TypeError, ValueError):
+            pass
+        if text is None:
+            # Don't replay the response without the full text when retrying
+            http_cache().evict(url, headers=headers)
+    return text
+
+
+def _content_from_doi_page(pii, doi, title):
+    html = content_from_doi(doi, title)
+    if html is None:
+        return None
+    return html_to_text(html) or None
+
+
+# Ways of downloading the content of a publication, by name. Each takes the
+# PII, DOI and title of the publication and returns its text (or None), along
+# with the access status of the content it returns and whether it can be
+# applied to a publication given its PII and DOI
+FetchStrategy = namedtuple('FetchStrategy', ['access_status', 'fetch', 'applies'])
+
+STRATEGIES = {
+    'sciencedirect': FetchStrategy(
+        PLAIN_TEXT_ACCESS_CONTENT,
+        fetch=lambda pii, doi, title: content_from_pii(pii),
+        applies=lambda pii, doi: bool(pii)),
+    'doi': FetchStrategy(
+        HTML_ACCESS_CONTENT,
+        fetch=_content_from_doi_page,
+        applies=lambda pii, doi: bool(doi)),
+    'wiley_tdm': FetchStrategy(
+        PDF_ACCESS_CONTENT,
+        fetch=lambda pii, doi, title: content_from_crossref(doi),
+        applies=lambda pii, doi: bool(doi) and crossref_token is not None)}
+
+# The strategies to try for the publications of each publisher, keyed by DOI
+# prefix or 'issn:<ISSN>' (for journals that need to be treated differently to
+# the rest of their publisher's). Extended/overridden by the FETCH_STRATEGIES
+# config option
+PUBLISHER_STRATEGIES = {
+    '10.1016': ['sciencedirect', 'doi'],  # Elsevier
+    '10.1002': ['doi', 'wiley_tdm'],  # Wiley
+    '10.1111': ['doi', 'wiley_tdm']}  # Wiley (Blackwell)
+
+DEFAULT_STRATEGIES = ['sciencedirect', 'doi']
+
+# How long a strategy that has mostly been blocked for a publisher (e.g. by
+# "Attention Required!" bot protection pages) is skipped for since it was last
+# blocked
+BLOCKED_TTL = timedelta(days=7)
+
+
+def publisher_key(doi, issn=None):
+    """
+    The key of the publisher of a publication that fetch strategies and their
+    statistics are recorded under, i.e. the prefix of its DOI or otherwise its
+    ISSN
+    """
+    if doi:
+        return doi.split('/', 1)[0]
+    if issn:
+        return 'issn:' + issn
+    return None
+
+
+def publisher_strategies(doi, issn=None):
+    """
+    The names of the strategies to try for a publication in order of preference
+    before any statistics are taken into account
+    """
+    registry = dict(PUBLISHER_STRATEGIES)
+    registry.update(app.config.get('FETCH_STRATEGIES', {}))
+    for key in ('issn:' + issn if issn else None, publisher_key(doi)):
+        if key in registry:
+            return registry[key]
+    return DEFAULT_STRATEGIES
+
+
+class StrategyStat():
+    """
+    Running totals of the attempts made with a strategy for a publisher
+    """
+
+    def __init__(self, attempts=0, successes=0, blocked=0, total_latency=0.0,
+                 last_blocked=None):
+        self.attempts = attempts
+        self.successes = successes
+        self.blocked = blocked
+        self.total_latency = total_latency
+        self.last_blocked = last_blocked
+
+    @property
+    def success_rate(self):
+        # Smoothed so that untried strategies rank between good and bad ones
+        return (self.successes + 1) / (self.attempts + 2)
+
+    @property
+    def mean_latency(self):
+        return self.total_latency / self.attempts if self.attempts else 0.0
+
+
+class StrategyStats():
+    """
+    The statistics of the strategies for each publisher, used to order the
+    strategies tried for each publication by their historical success rate and
+    latency. Loaded from (and saved to) the database in the main thread by
+    `app.fetch_stats`, so they can be read by the download threads
+
+    Parameters
+    ----------
+    stats : dict[tuple[str, str], StrategyStat]
+        The statistics keyed by publisher and strategy name
+    """
+
+    def __init__(self, stats=None):
+        self.stats = dict(stats or {})
+
+    def get(self, publisher, strategy):
+        return self.stats.get((publisher, strategy), StrategyStat())
+
+    def order(self, publisher, strategies):
+        """
+        Sort strategies by their success rate and then their mean latency for
+        the publisher (ties keep their order)
+        """
+        def rank(strategy):
+            stat = self.get(publisher, strategy)
+            return (-stat.success_rate, stat.mean_latency)
+        return sorted(strategies, key=rank)
+
+    def is_blocked(self, publisher, strategy, now=None):
+        """
+        Whether most attempts with a strategy for a publisher have been blocked
+        and it was last blocked recently
+        """
+        stat = self.get(publisher, strategy)
+        if stat.last_blocked is None or 2 * stat.blocked <= stat.attempts:
+            return False
+        return (now or datetime.now()) - stat.last_blocked < BLOCKED_TTL
+
+    def record(self, attempt, at=None):
+        """
+        Add an attempt to the statistics
+        """
+        stat = self.stats.setdefault((attempt.publisher, attempt.strategy),
+                                     StrategyStat())
+        stat.attempts += 1
+        stat.total_latency += attempt.latency
+        if attempt.outcome == SUCCEEDED:
+            stat.successes += 1
+        elif attempt.outcome == BLOCKED:
+            stat.blocked += 1
+            stat.last_blocked = at or datetime.now()
+
+
+def fetch_content(pii, doi, title=None, issn=None, stats=None):
+    """
+    Fetch the content of a publication, trying the strategies registered for
+    its publisher in order of their success rate and latency until one succeeds
+
+    Parameters
+    ----------
+    pii, doi, title, issn : str or None
+        The PII, DOI, title and ISSN of the publication
+    stats : StrategyStats or None
+        The statistics of previous attempts, used to order the strategies and
+        skip those that are being blocked
+
+    Returns
+    -------
+    access_status : int
+        The access status constant for the publication
+    content : str or None
+        The downloaded content as plain text (the text of the article is
+        extracted from HTML pages and PDFs)
+    attempts : list[FetchAttempt]
+        The attempts made with each strategy
+    error : Exception or None
+        The last error raised by a strategy if none of them succeeded
+    """
+    if stats is None:
+        stats = StrategyStats()
+    publisher = publisher_key(doi, issn)
+    status = UNKNOWN_ACCESS_CONTENT
+    attempts = []
+    error = None
+    for name in stats.order(publisher, publisher_strategies(doi, issn)):
+        strategy = STRATEGIES[name]
+        if not strategy.applies(pii, doi):
+            continue
+        status = CANT_ACCESS_CONTENT
+        if stats.is_blocked(publisher, name):
+            logger.debug("Skipping blocked strategy '%s' for %s", name,
+                         publisher)
+            continue
+        start = time.monotonic()
+        content = None
+        try:
+            content = strategy.fetch(pii, doi, title)
+            outcome = SUCCEEDED if content else FAILED
+        except AccessBlockedError as e:
+            logger.info(str(e))
+            outcome = BLOCKED
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Strategy '%s' failed for %s: %s", name,
+                           doi or pii, e)
+            outcome = FAILED
+            error = e
+        attempts.append(FetchAttempt(publisher, name, outcome,
+                                     time.monotonic() - start))
+        if content:
+            return strategy.access_status, content, attempts, None
+    return status, None, attempts, error
+
+
+def failure_reason(result):
+    """
+    Summarise why the content of a publication couldn't be downloaded
+
+    Parameters
+    ----------
+    result : FetchResult
+        The result of the download
+
+    Returns
+    -------
+    str
+        The reason, e.g. 'sciencedirect failed, doi blocked'
+    """
+    if result.error is not None:
+        return "{}: {}".format(type(result.error).__name__, result.error)
+    if result.attempts:
+        return ", ".join("{} {}".format(a.strategy, a.outcome)
+                         for a in result.attempts)
+    if result.access_status == UNKNOWN_ACCESS_CONTENT:
+        return "no strategy for publication"
+    return "all strategies blocked"
+
+
+def fetch_contents(pubs, workers=16, stats=None):
+    """
+    Download the content of publications concurrently over a pool of threads.
+    Results are yielded in the calling thread as they complete so they can be
+    saved to the database there.
+
+    Parameters
+    ----------
+    pubs : iterable[tuple]
+        Tuples of (key, pii, doi, title, issn) for each publication
+    workers : int
+        The maximum number of publications to download concurrently (requests to
+        each host are further limited by MAX_REQUESTS_PER_HOST)
+    stats : StrategyStats or None
+        The statistics of previous attempts (see `fetch_content`)
+
+    Yields
+    ------
+    FetchResult
+        The key, access status and content of each publication, along with the
+        exception raised if the download failed and the attempts made with
+        each strategy
+    """
+    if crossref_token is not None:
+        # Fork the workers extracting the (Wiley TDM) PDFs before the download
+        # threads are started
+        start_pdf_pool()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(fetch_content, pii, doi, title, issn, stats): key
+            for key, pii, doi, title, issn in pubs}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                status, content, attempts, error = future.result()
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning("Could not fetch content for %s: %s", key, e)
+                status, content, attempts, error = (CANT_ACCESS_CONTENT, None,
+                                                    (), e)
+            yield FetchResult(key, status, content, error, attempts)
@@ -0,0 +1,70 @@
+"""
+Persistence of the statistics of the strategies used to download the content of
+publications, so that the strategies tried for each publisher are ordered by
+their success rate and latency across runs
+"""
+from datetime import datetime
+from app import db
+from app.fetch import SUCCEEDED, BLOCKED, StrategyStat, StrategyStats
+from app.models import FetchStrategyStat
+from app.ingest import insert_ignoring_conflicts
+
+
+def load_strategy_stats():
+    """
+    Load the statistics of all fetch strategies from the database
+
+    Returns
+    -------
+    StrategyStats
+        The statistics, to be passed to `app.fetch.fetch_contents`
+    """
+    return StrategyStats({
+        (s.publisher, s.strategy): StrategyStat(
+            attempts=s.attempts, successes=s.successes, blocked=s.blocked,
+            total_latency=s.total_latency, last_blocked=s.last_blocked)
+        for s in FetchStrategyStat.query.all()})
+
+
+def save_attempts(attempts, stats=None):
+    """
+    Add fetch attempts to the statistics in the database (not committed, so they
+    can be committed along with the content downloaded). The totals are
+    incremented in place so that concurrent workers don't overwrite each
+    other's attempts.
+
+    Parameters
+    ----------
+    attempts : iterable[FetchAttempt]
+        The attempts made to download the content of a publication
+    stats : StrategyStats or None
+        In-memory statistics to also add the attempts to, so that they are taken
+        into account for the rest of the run
+    """
+    now = datetime.now()
+    table = FetchStrategyStat.__table__
+    for attempt in attempts:
+        if stats is not None:
+            stats.record(attempt, at=now)
+        if attempt.publisher is None:
+            continue
+        values = {
+            'attempts': table.c.attempts + 1,
+            'total_latency': table.c.total_latency + attempt.latency,
+            'last_attempt': now}
+        if attempt.outcome == SUCCEEDED:
+            values['successes'] = table.c.successes + 1
+        elif attempt.outcome == BLOCKED:
+            values['blocked'] = table.c.blocked + 1
+            values['last_blocked'] = now
+        update = table.update().where(
+            table.c.publisher == attempt.publisher,
+            table.c.strategy == attempt.strategy).values(values)
+        if not db.session.execute(update).rowcount:
+            # First attempt with the strategy for the publisher (unless another
+            # worker has just inserted it)
+            insert_ignoring_conflicts(table, [{
+                'publisher': attempt.publisher, 'strategy': attempt.strategy,
+                'attempts': 0, 'successes': 0, 'blocked': 0,
+                'total_latency': 0.0}])
+            db.session.execute(update)
@@ -0,0 +1,171 @@
+"""
+Concurrent harvesting of publication records from Scopus for the authors in the
+database
+"""
+import logging
+from datetime import timedelta
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app import db
+from app.utils.rate_limit import RateLimiter
+from app.models import ScopusAuthorSync
+
+logger = logging.getLogger(__name__)
+
+HarvestResult = namedtuple('HarvestResult', ['key', 'results', 'error'])
+
+
+def date_clause(start_date=None, end_date=None, loaded_after=None):
+    """
+    Build the clause of a Scopus search query that restricts the results to a
+    date window
+
+    Parameters
+    ----------
+    start_date : date or None
+        Only include publications published in or after this year
+    end_date : date or None
+        Only include publications published in or before this year
+    loaded_after : date or None
+        Only include records loaded into Scopus after this date
+
+    Returns
+    -------
+    str
+        The clause to append to the search query (empty if no window)
+    """
+    clause = ""
+    if start_date is not None:
+        clause += f" AND PUBYEAR > {start_date.year - 1}"
+    if end_date is not None:
+        clause += f" AND PUBYEAR < {end_date.year + 1}"
+    if loaded_after is not None:
+        clause += f" AND LOAD-DATE AFT {loaded_after.strftime('%Y%m%d')}"
+    return clause
+
+
+def author_query(scopus_id, **kwargs):
+    """
+    Build a Scopus search query for the publications of an author, pushing the
+    date window down into the search so that only matching records are
+    downloaded
+
+    Parameters
+    ----------
+    scopus_id : int
+        The Scopus ID of the author
+    **kwargs
+        The date window passed to `date_clause`
+
+    Returns
+    -------
+    str
+        The search query
+    """
+    return f"au-id({scopus_id})" + date_clause(**kwargs)
+
+
+def sync_window(author, start_date, end_date, full=False):
+    """
+    Determine the window of publications to search for an author, only
+    including the records loaded into Scopus since the last sync if the author
+    has already been synced over the requested date range
+
+    Parameters
+    ----------
+    author : ScopusAuthor
+        The author to search the publications of
+    start_date : date
+        The start of the date range to sync
+    end_date : date or None
+        The end of the date range to sync, None for an open-ended sync
+    full : bool
+        Ignore the previous sync and search the whole date range
+
+    Returns
+    -------
+    dict
+        Keyword arguments to pass to `author_query`/`lookup_author_pubs`
+    """
+    kwargs = {"start_date": start_date, "end_date": end_date}
+    sync = author.sync
+    if (not full and sync is not None and sync.last_synced is not None
+            and sync.synced_from <= start_date):
+        # Overlap with the previous sync by a day to allow for the granularity
+        # of the load dates, duplicates are skipped on ingest
+        kwargs["loaded_after"] = sync.last_synced.date() - timedelta(days=1)
+    return kwargs
+
+
+def mark_synced(author, synced_at, window):
+    """
+    Record the high-water mark of a successful sync of an author's publications.
+    Should only be called for open-ended syncs, as publications after the end
+    date would otherwise be skipped by the next incremental sync
+
+    Parameters
+    ----------
+    author : ScopusAuthor
+        The author that was synced
+    synced_at : datetime
+        The time the sync started
+    window : dict
+        The search window returned by `sync_window`
+    """
+    if author.sync is None:
+        # Added explicitly as new objects aren't cascaded into the session
+        # through backrefs
+        db.session.add(ScopusAuthorSync(author, synced_from=window["start_date"]))
+    elif "loaded_after" not in window:
+        author.sync.synced_from = window["start_date"]
+    author.sync.last_synced = synced_at
+
+
+def harvest(keys, search, workers=8, rate=None, limiter=None):
+    """
+    Fans out Scopus searches over a bounded pool of worker threads, while
+    keeping the overall request rate within the quota of the API key.
+
+    Results are yielded in the calling thread as they complete so that a single
+    writer can add them to the database (the session must not be shared between
+    the worker threads).
+
+    Parameters
+    ----------
+    keys : iterable
+        The keys to search for (e.g. Scopus author IDs), which are passed to
+        `search`
+    search : callable
+        Function that takes a key and returns a list of search results
+    workers : int
+        The maximum number of concurrent searches
+    rate : float or None
+        The maximum number of searches started per second
+    limiter : RateLimiter or RedisRateLimiter or None
+        Limiter shared with other processes to use instead of limiting the
+        searches to `rate`
+
+    Yields
+    ------
+    HarvestResult
+        The key, the search results (None on failure) and the exception raised
+        by the search if it failed
+    """
+    if limiter is None:
+        limiter = RateLimiter(rate)
+
+    def limited_search(key):
+        limiter.wait()
+        return search(key)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(limited_search, k): k for k in keys}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning("Search for '%s' failed: %s", key, e)
+                yield HarvestResult(key, None, e)
+            else:
+                yield HarvestResult(key, results, None)
@@ -0,0 +1,191 @@
+"""
+Bulk ingestion of publication records returned by Scopus searches into the
+database
+"""
+from datetime import datetime
+from itertools import islice
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Publication, ScopusAuthor, scopusauthor_publication_assoc
+
+SCOPUS_DATE_FORMAT = "%Y-%m-%d"
+
+
+def publication_row(pub):
+    """
+    Convert a Scopus search result into a row of column values for the
+    publications table
+
+    Parameters
+    ----------
+    pub : namedtuple
+        A search result returned by pybliometrics.scopus.ScopusSearch
+
+    Returns
+    -------
+    dict
+        Values of the publication columns
+    """
+    return {
+        'date': datetime.strptime(pub.coverDate, SCOPUS_DATE_FORMAT).date(),
+        'doi': pub.doi,
+        'scopus_id': pub.eid.split("-")[-1],
+        'pii': pub.pii,
+        'title': pub.title,
+        'pubmed_id': pub.pubmed_id,
+        'volume': pub.volume,
+        'pub_name': pub.publicationName,
+        'openaccess': (pub.openaccess == "1"),
+        'issue_id': pub.issueIdentifier,
+        'abstract': pub.description,
+        'issn': pub.issn,
+        # Content hasn't been downloaded yet, so its availability doesn't need
+        # to be looked up in the content store
+        'content_available': False}
+
+
+def chunks(iterable, size):
+    """
+    Split an iterable into lists of at most `size` items
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def insert_ignoring_conflicts(table, rows):
+    """
+    Insert rows into a table, skipping any that violate a unique constraint
+    (e.g. because they were inserted concurrently by another worker). The rows
+    are inserted in bulk, falling back to one at a time if that conflicts.
+
+    Parameters
+    ----------
+    table : sqlalchemy.Table
+        The table to insert into
+    rows : list[dict]
+        The rows to insert
+
+    Returns
+    -------
+    list[dict]
+        The rows that were inserted
+    """
+    if not rows:
+        return []
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert(), rows)
+        return rows
+    except IntegrityError:
+        pass
+    inserted = []
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert(), [row])
+        except IntegrityError:
+            continue
+        inserted.append(row)
+    return inserted
+
+
+def ingest_publications(pubs, batch_size=500):
+    """
+    Add Scopus search results that aren't already in the database and link
+    them (along with any that are) to the Scopus authors in the database.
+
+    Each batch only looks up the existing publications, links and authors it
+    refers to, and inserts the rest in bulk in a single transaction. Rows that
+    conflict with ones inserted concurrently (e.g. a paper co-authored by two
+    authors harvested by parallel workers) are skipped and linked to instead.
+
+    Parameters
+    ----------
+    pubs : iterable[namedtuple]
+        Search results returned by pybliometrics.scopus.ScopusSearch
+    batch_size : int
+        The number of publications to insert per transaction
+
+    Returns
+    -------
+    list[int]
+        The IDs of the publications added
+    """
+    seen = set()
+
+    def unique_pubs():
+        for pub in pubs:
+            row = publication_row(pub)
+            if row['scopus_id'] in seen:
+                continue
+            seen.add(row['scopus_id'])
+            yield row, pub.author_ids
+
+    new_pub_ids = []
+    for batch in chunks(unique_pubs(), batch_size):
+        scopus_ids = [row['scopus_id'] for row, _ in batch]
+        dois = [row['doi'] for row, _ in batch if row['doi']]
+        existing = db.session.query(Publication.scopus_id, Publication.doi).filter(
+            db.or_(Publication.scopus_id.in_(scopus_ids),
+                   Publication.doi.in_(dois)))
+        existing_scopus_ids = set()
+        existing_dois = set()
+        for scopus_id, doi in existing:
+            existing_scopus_ids.add(scopus_id)
+            existing_dois.add(doi)
+        new_rows = []
+        for row, _ in batch:
+            if (row['scopus_id'] in existing_scopus_ids
+                    or (row['doi'] and row['doi'] in existing_dois)):
+                continue
+            if row['doi']:
+                existing_dois.add(row['doi'])
+            new_rows.append(row)
+        inserted = insert_ignoring_conflicts(Publication.__table__, new_rows)
+
+        pub_ids = {}
+        doi_pub_ids = {}
+        for pub_id, scopus_id, doi in db.session.query(
+                Publication.id, Publication.scopus_id, Publication.doi).filter(
+                    db.or_(Publication.scopus_id.in_(scopus_ids),
+                           Publication.doi.in_(dois))):
+            pub_ids[scopus_id] = pub_id
+            if doi:
+                doi_pub_ids[doi] = pub_id
+        batch_author_ids = set()
+        for _, pub_author_ids in batch:
+            for pub_author in (pub_author_ids or '').split(";"):
+                try:
+                    batch_author_ids.add(int(pub_author))
+                except ValueError:
+                    continue
+        author_ids = dict(db.session.query(
+            ScopusAuthor.scopus_id, ScopusAuthor.id).filter(
+                ScopusAuthor.scopus_id.in_(batch_author_ids)))
+        links = set(db.session.query(
+            scopusauthor_publication_assoc.c.scopusauthor_id,
+            scopusauthor_publication_assoc.c.publication_id).filter(
+                scopusauthor_publication_assoc.c.publication_id.in_(
+                    set(pub_ids.values()) | set(doi_pub_ids.values()))))
+        assoc_rows = []
+        for row, pub_author_ids in batch:
+            # Publications matched by DOI may be stored under another Scopus ID
+            pub_id = pub_ids.get(row['scopus_id'], doi_pub_ids.get(row['doi']))
+            if pub_id is None:
+                continue
+            for pub_author in (pub_author_ids or '').split(";"):
+                try:
+                    author_id = author_ids[int(pub_author)]
+                except (KeyError, ValueError):
+                    continue
+                if (author_id, pub_id) not in links:
+                    links.add((author_id, pub_id))
+                    assoc_rows.append({'scopusauthor_id': author_id,
+                                       'publication_id': pub_id})
+        insert_ignoring_conflicts(scopusauthor_publication_assoc, assoc_rows)
+        db.session.commit()
+        new_pub_ids.extend(pub_ids[row['scopus_id']] for row in inserted)
+    return new_pub_ids
@@ -0,0 +1,130 @@
+"""
+Journal of the items processed by the harvesting scripts, so that a run that
+fails partway through (e.g. due to a network outage or an expired API key) can
+be resumed without repeating the (paid) API calls of the items it completed
+"""
+import json
+from datetime import datetime
+from app import db
+from app.constants import COMPLETED_RUN_ITEM, FAILED_RUN_ITEM
+from app.exceptions import NifReportingException
+from app.models import HarvestRun, HarvestRunItem
+
+
+def start_run(script, arguments, resume=False):
+    """
+    Start a new run of a script, or resume its last unfinished run
+
+    Parameters
+    ----------
+    script : str
+        The name of the script
+    arguments : dict
+        The arguments of the run that determine which items it processes,
+        saved so they can be restored when it is resumed
+    resume : bool
+        Whether to resume the last unfinished run instead of starting a new one
+
+    Returns
+    -------
+    HarvestRun
+        The run
+
+    Raises
+    ------
+    NifReportingException
+        If resuming and there is no unfinished run of the script
+    """
+    if resume:
+        run = (HarvestRun.query
+               .filter_by(script=script, finished=None)
+               .order_by(HarvestRun.started.desc())
+               .first())
+        if run is None:
+            raise NifReportingException(
+                "No unfinished run of {} to resume".format(script))
+        return run
+    run = HarvestRun(script, json.dumps(arguments), started=datetime.now())
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def run_arguments(run):
+    """
+    The arguments the run was started with
+    """
+    return json.loads(run.arguments) if run.arguments else {}
+
+
+def completed_keys(run, kind):
+    """
+    The keys of the items of a kind that have been completed in a run
+
+    Returns
+    -------
+    set[str]
+        The keys of the completed items
+    """
+    return {key for key, in db.session.query(HarvestRunItem.key).filter_by(
+        run_id=run.id, kind=kind, status=COMPLETED_RUN_ITEM)}
+
+
+def failed_keys(run, kind):
+    """
+    The keys of the items of a kind that failed in a run
+
+    Returns
+    -------
+    set[str]
+        The keys of the failed items
+    """
+    return {key for key, in db.session.query(HarvestRunItem.key).filter_by(
+        run_id=run.id, kind=kind, status=FAILED_RUN_ITEM)}
+
+
+def record_item(run, kind, key, error=None):
+    """
+    Record the outcome of processing an item in a run. Not committed, so that it
+    can be committed in the same transaction as the results of the item.
+
+    Parameters
+    ----------
+    run : HarvestRun
+        The run
+    kind : str
+        The kind of item (e.g. 'author' or 'publication')
+    key
+        The key of the item (e.g. the Scopus ID of an author)
+    error : Exception or str or None
+        The error raised when processing the item if it failed
+    """
+    key = str(key)
+    status = COMPLETED_RUN_ITEM if error is None else FAILED_RUN_ITEM
+    error = str(error) if error is not None else None
+    item = HarvestRunItem.query.filter_by(run_id=run.id, kind=kind,
+                                          key=key).first()
+    if item is None:
+        db.session.add(HarvestRunItem(run, kind, key, status, error=error,
+                                      completed=datetime.now()))
+    else:
+        item.status = status
+        item.error = error
+        item.completed = datetime.now()
+
+
+def finish_run(run):
+    """
+    Mark a run as finished if none of its items failed, otherwise leave it to be
+    resumed
+
+    Returns
+    -------
+    int
+        The number of items that failed
+    """
+    num_failed = run.items.filter_by(status=FAILED_RUN_ITEM).count()
+    if not num_failed:
+        run.finished = datetime.now()
+    db.session.commit()
+    return num_failed
@@ -2,9 +2,11 @@
 Database models for monitoring researchers who have used the facility and their
 outputs
 """
-import os.path
+import hashlib
+from datetime import datetime, timedelta
 from sqlalchemy import orm
-from app import db, PKG_DIR
+from app import app, db
+from app.content_store import content_store
 from app.constants import NIF_ASSOC
 from app.exceptions import NifReportingException
 
@@ -68,10 +70,8 @@ class Publication(db.Model):
 
     __tablename__ = 'publications'
 
-    CONTENT_DIR = os.path.join(PKG_DIR, 'publication-content')
-
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.Date)
+    date = db.Column(db.Date, index=True)
     scopus_id = db.Column(db.String(100), unique=True)
     doi = db.Column(db.String(200), unique=True)
     pii = db.Column(db.String(100), unique=True)
@@ -82,14 +82,32 @@ class Publication(db.Model):
     openaccess = db.Column(db.Boolean)
     issue_id = db.Column(db.String(100))
     issn = db.Column(db.String(100))
-    nif_assoc = db.Column(db.Integer)
-    access_status = db.Column(db.Integer)
+    nif_assoc = db.Column(db.Integer, index=True)
+    access_status = db.Column(db.Integer, index=True)
+    content_available = db.Column(db.Boolean, index=True)
+    content_format = db.Column(db.String(10))
+    content_size = db.Column(db.Integer)
+    content_checksum = db.Column(db.String(64))
+    # Provenance of the last automatic classification of NIF association, used
+    # to skip rescanning content that hasn't changed since
+    classified_nif_assoc = db.Column(db.Integer)
+    classified_checksum = db.Column(db.String(64))
+    classified_rules = db.Column(db.String(16))
+    # Failed attempts to download the content, which are retried with an
+    # exponential backoff (see `record_content_failure`)
+    content_failures = db.Column(db.Integer)
+    content_failed_at = db.Column(db.DateTime)
+    content_failure_reason = db.Column(db.String(200))
+    content_retry_after = db.Column(db.DateTime, index=True)
     abstract = orm.deferred(db.Column(db.Text))
     #content = orm.deferred(db.Column(db.Text))
 
     scopus_authors = db.relationship(
         'ScopusAuthor', secondary='scopusauthor_publication_assoc')
 
+    __table_args__ = (
+        db.Index('ix_publications_nif_assoc_date', 'nif_assoc', 'date'),)
+
     def __init__(self, doi, title, scopus_id=None, pii=None, date=None,
                  pubmed_id=None, volume=None, pub_name=None, openaccess=None,
                  issue_id=None, issn=None, nif_funded=None, access_status=None,
@@ -108,6 +126,7 @@ class Publication(db.Model):
         self.nif_funded = nif_funded
         self.nif_assoc = nif_assoc
         self.abstract = abstract
+        self.content_available = False
         self.content = content
         self.access_status = access_status
         # self.author_ids = author_ids
@@ -116,25 +135,106 @@ class Publication(db.Model):
     def content(self):
         if not self.has_content:
             return None
-        with open(self.content_path) as f:
-            content = f.read()
-        return content
+        return content_store().read(self.content_key)
 
     @content.setter
     def content(self, content):
         if content is not None:
-            with open(self.content_path, 'w') as f:
-                f.write(str(content))
+            content = str(content)
+            # Content is stored as plain text (HTML pages are converted by
+            # app.extract.html_to_text when they are downloaded)
+            self.content_format = 'txt'
+            content_store().write(self.content_key, content)
+            self.index_content(content)
+            self.content_failures = None
+            self.content_retry_after = None
+
+    def index_content(self, content):
+        """
+        Record the availability, format, size and checksum of the content in
+        the database so they can be queried without touching the content store
+
+        Parameters
+        ----------
+        content : str or None
+            The stored content of the publication
+        """
+        if content is None:
+            self.content_available = False
+            self.content_format = None
+            self.content_size = None
+            self.content_checksum = None
+        else:
+            data = content.encode('utf-8')
+            self.content_available = True
+            self.content_format = self.content_key.split('.')[-1]
+            self.content_size = len(data)
+            self.content_checksum = hashlib.sha256(data).hexdigest()
+
+    def record_content_failure(self, reason, failed_at=None):
+        """
+        Record a failed attempt to download the content and schedule the next
+        attempt after a delay that doubles with each consecutive failure,
+        starting from CONTENT_RETRY_DAYS (default 1) up to CONTENT_RETRY_MAX_DAYS
+        (default 180) config options
+
+        Parameters
+        ----------
+        reason : str
+            Why the download failed
+        failed_at : datetime or None
+            When the download failed, now if None
+        """
+        if failed_at is None:
+            failed_at = datetime.now()
+        self.content_available = False
+        self.content_failures = (self.content_failures or 0) + 1
+        self.content_failed_at = failed_at
+        self.content_failure_reason = reason[:200] if reason else None
+        delay = min(
+            app.config.get('CONTENT_RETRY_DAYS', 1)
+            * 2 ** (self.content_failures - 1),
+            app.config.get('CONTENT_RETRY_MAX_DAYS', 180))
+        self.content_retry_after = failed_at + timedelta(days=delay)
+
+    @classmethod
+    def content_retry_due(cls, now=None):
+        """
+        Filter clause selecting the publications whose content hasn't failed to
+        download or is due to be retried
+        """
+        if now is None:
+            now = datetime.now()
+        return db.or_(cls.content_retry_after == None,  # noqa: E711
+                      cls.content_retry_after <= now)
+
+    @property
+    def content_key(self):
+        # Content downloaded before it was indexed is stored as text if it was
+        # retrieved via the ScienceDirect API and as raw HTML otherwise
+        content_format = self.content_format or ('txt' if self.pii else 'html')
+        return str(self.scopus_id) + '.' + content_format
 
     @property
     def content_path(self):
-        path = os.path.join(self.CONTENT_DIR, str(self.scopus_id))
-        path += ('.txt' if self.pii else '.html')
-        return path
+        return content_store().path(self.content_key)
 
     @property
     def has_content(self):
-        return os.path.exists(self.content_path)
+        if self.content_available is None:
+            # Created before the content was indexed and not indexed yet (see
+            # scripts/index_content.py)
+            return content_store().exists(self.content_key)
+        return self.content_available
+
+    def is_classified(self, rules_version):
+        """
+        Whether the current content has already been classified with the given
+        version of the classification rules
+        """
+        return (self.content_checksum is not None
+                and self.classified_checksum == self.content_checksum
+                and self.classified_rules == rules_version)
 
     @property
     def nif_assoc_str(self):
@@ -188,6 +288,9 @@ class ScopusAuthor(db.Model):
     publications = db.relationship(
         'Publication', secondary='scopusauthor_publication_assoc')
 
+    sync = db.relationship('ScopusAuthorSync', uselist=False,
+                           backref='scopus_author')
+
     def __init__(self, scopus_id, researcher=None, affiliation=None,
                  areas=None, givenname=None, surname=None):
         self.scopus_id = scopus_id
@@ -203,14 +306,125 @@ class ScopusAuthor(db.Model):
         return '{} {}'.format(self.givenname, self.surname)
 
 
+class ScopusAuthorSync(db.Model):
+    """
+    The high-water mark of the last successful sync of publications of a Scopus
+    author, so that subsequent syncs only need to fetch the records that have
+    been loaded into Scopus since then
+    """
+
+    __tablename__ = 'scopusauthor_syncs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    scopusauthor_id = db.Column(db.Integer,
+                                db.ForeignKey(
+                                    'scopusauthors.id',
+                                    name='fk_scopusauthorsyncs_scopusauthor'),
+                                unique=True)
+    last_synced = db.Column(db.DateTime)
+    synced_from = db.Column(db.Date)
+
+    def __init__(self, scopus_author, last_synced=None, synced_from=None):
+        self.scopus_author = scopus_author
+        self.last_synced = last_synced
+        self.synced_from = synced_from
+
+
+class HarvestRun(db.Model):
+    """
+    A run of one of the harvesting scripts, journalling the items (e.g. authors
+    or publications) it has processed so that a run that fails partway through
+    can be resumed without repeating them
+    """
+
+    __tablename__ = 'harvest_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    script = db.Column(db.String(50), index=True)
+    arguments = db.Column(db.Text)
+    started = db.Column(db.DateTime)
+    finished = db.Column(db.DateTime)
+
+    items = db.relationship('HarvestRunItem', backref='run', lazy='dynamic')
+
+    def __init__(self, script, arguments=None, started=None):
+        self.script = script
+        self.arguments = arguments
+        self.started = started
+
+
+class HarvestRunItem(db.Model):
+    """
+    The outcome of processing an item in a harvesting run
+    """
+
+    __tablename__ = 'harvest_run_items'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer,
+                       db.ForeignKey('harvest_runs.id',
+                                     name='fk_harvestrunitems_harvestrun'))
+    kind = db.Column(db.String(20))
+    key = db.Column(db.String(100))
+    status = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    completed = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('run_id', 'kind', 'key',
+                            name='uq_harvest_run_items_run_kind_key'),)
+
+    def __init__(self, run, kind, key, status, error=None, completed=None):
+        self.run = run
+        self.kind = kind
+        self.key = key
+        self.status = status
+        self.error = error
+        self.completed = completed
+
+
+class FetchStrategyStat(db.Model):
+    """
+    Running totals of the attempts to download the content of the publications
+    of a publisher with one of the fetch strategies (see app.fetch.STRATEGIES)
+    """
+
+    __tablename__ = 'fetch_strategy_stats'
+
+    id = db.Column(db.Integer, primary_key=True)
+    publisher = db.Column(db.String(50))
+    strategy = db.Column(db.String(20))
+    attempts = db.Column(db.Integer)
+    successes = db.Column(db.Integer)
+    blocked = db.Column(db.Integer)
+    total_latency = db.Column(db.Float)
+    last_attempt = db.Column(db.DateTime)
+    last_blocked = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('publisher', 'strategy',
+                            name='uq_fetch_strategy_stats_publisher_strategy'),)
+
+    def __init__(self, publisher, strategy):
+        self.publisher = publisher
+        self.strategy = strategy
+        self.attempts = 0
+        self.successes = 0
+        self.blocked = 0
+        self.total_latency = 0.0
+
+
 scopusauthor_publication_assoc = db.Table(
     'scopusauthor_publication_assoc', db.Model.metadata,
     db.Column('id', db.Integer, primary_key=True),
     db.Column(
-        'scopusauthor_id', db.String(20), db.ForeignKey(
+        'scopusauthor_id', db.Integer, db.ForeignKey(
             'scopusauthors.id',
             name='fk_scopusauthorpublicationassoc_scopusauthor')),
     db.Column(
         'publication_id', db.Integer, db.ForeignKey(
             'publications.id',
-            name='fk_scopusauthorpublicationassoc_publication')))
+            name='fk_scopusauthorpublicationassoc_publication'),
+        index=True),
+    db.Index('ix_scopusauthor_publication_assoc_scopusauthor_publication',
+             'scopusauthor_id', 'publication_id', unique=True))
@@ -0,0 +1,150 @@
+"""
+Extraction of the text of PDF articles, which are spooled to disk as they are
+downloaded and have their pages extracted in parallel over a pool of worker
+processes
+"""
+import os
+import logging
+from functools import lru_cache
+from app import app
+from app.exceptions import ContentTooLargeError
+from app.utils.processes import process_pool, start_pool
+
+try:
+    from PyPDF2 import PdfReader
+except ImportError:  # PyPDF2 < 1.28
+    from PyPDF2 import PdfFileReader as PdfReader
+
+logger = logging.getLogger(__name__)
+
+# Size of the chunks the response is written to disk in
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Minimum number of pages extracted by a worker, as each worker has to parse
+# the structure of the whole document before it can extract its pages
+# (documents with fewer pages are extracted in the calling process)
+MIN_PAGES_PER_TASK = 16
+
+
+def pdf_workers():
+    """
+    The number of worker processes to extract PDFs with, set by the PDF_WORKERS
+    config option (defaults to the number of CPUs)
+    """
+    return app.config.get('PDF_WORKERS') or os.cpu_count() or 1
+
+
+@lru_cache()
+def pdf_pool():
+    """
+    The pool of worker processes shared by all PDF extractions
+    """
+    return process_pool(pdf_workers())
+
+
+def start_pdf_pool():
+    """
+    Start the workers of the shared pool (if PDFs are extracted in parallel),
+    which needs to be done before starting any threads that extract PDFs
+    """
+    if pdf_workers() > 1:
+        start_pool(pdf_pool())
+
+
+def spool_response(response, file, max_size=None):
+    """
+    Write the body of a streamed response to a file without holding it in
+    memory
+
+    Parameters
+    ----------
+    response : requests.Response
+        The response, requested with `stream=True`
+    file : file-like
+        The (binary) file to write to
+    max_size : int or None
+        The maximum size of the body in bytes, the PDF_MAX_SIZE config option
+        (default 50 MB) if None
+
+    Raises
+    ------
+    ContentTooLargeError
+        If the body is larger than the maximum size
+    """
+    if max_size is None:
+        max_size = app.config.get('PDF_MAX_SIZE', 50 * 1024 ** 2)
+    if int(response.headers.get('Content-Length') or 0) > max_size:
+        raise ContentTooLargeError(
+            "PDF at {} is larger than {} bytes".format(response.url, max_size))
+    size = 0
+    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_size:
+            raise ContentTooLargeError(
+                "PDF at {} is larger than {} bytes".format(response.url,
+                                                           max_size))
+        file.write(chunk)
+    file.flush()
+
+
+def extract_pages(task):
+    """
+    Extract the text of a range of pages of a PDF
+
+    Parameters
+    ----------
+    task : tuple[str, int, int]
+        The path to the PDF and the start and stop indices of the pages
+
+    Returns
+    -------
+    list[str]
+        The text of each page (empty if it couldn't be extracted)
+    """
+    path, start, stop = task
+    reader = PdfReader(path, strict=False)
+    texts = []
+    for i in range(start, stop):
+        page = reader.pages[i]
+        try:
+            if hasattr(page, 'extract_text'):
+                texts.append(page.extract_text())
+            else:
+                texts.append(page.extractText())
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Could not extract page %d of %s: %s", i, path, e)
+            texts.append('')
+    return texts
+
+
+def pdf_text(path, max_pages=None):
+    """
+    Extract the text of a PDF, splitting its pages between the worker processes
+    of the shared pool
+
+    Parameters
+    ----------
+    path : str
+        The path to the PDF
+    max_pages : int or None
+        The maximum number of pages to extract (e.g. to skip the bulk of very
+        large supplementary material), the PDF_MAX_PAGES config option (default
+        200) if None
+
+    Returns
+    -------
+    str
+        The text of the pages, separated by newlines
+    """
+    if max_pages is None:
+        max_pages = app.config.get('PDF_MAX_PAGES', 200)
+    num_pages = min(len(PdfReader(path, strict=False).pages), max_pages)
+    # Split the pages into one contiguous range per worker
+    num_tasks = max(min(pdf_workers(), num_pages // MIN_PAGES_PER_TASK), 1)
+    bounds = [num_pages * i // num_tasks for i in range(num_tasks + 1)]
+    tasks = [(path, start, stop) for start, stop in zip(bounds, bounds[1:])]
+    if len(tasks) > 1:
+        results = pdf_pool().map(extract_pages, tasks)
+    else:
+        results = map(extract_pages, tasks)
+    return '\n'.join(text for texts in results for text in texts)
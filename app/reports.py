@@ -0,0 +1,101 @@
+"""
+Queries used to generate reports on the publications in the database
+"""
+from sqlalchemy import orm
+from app import db
+from app.models import Publication, ScopusAuthor
+
+# Number of rows fetched from the server-side cursor at a time when streaming
+STREAM_BATCH_SIZE = 1000
+
+
+def filter_publications(query, start_date=None, end_date=None, nif_assoc=None):
+    """
+    Filter a query on publications by date range and NIF association
+    """
+    if start_date is not None:
+        query = query.filter(Publication.date >= start_date)
+    if end_date is not None:
+        query = query.filter(Publication.date <= end_date)
+    if nif_assoc is not None:
+        query = query.filter(Publication.nif_assoc == nif_assoc)
+    return query
+
+
+def publications_query(start_date=None, end_date=None, nif_assoc=None,
+                       with_researchers=True):
+    """
+    Build a query for publications, eagerly loading their authors and the
+    researchers they belong to so that reports can list the researchers involved
+    in each publication in a constant number of SQL statements (rather than two
+    extra per publication)
+
+    Parameters
+    ----------
+    start_date : date or None
+        Only include publications on or after this date
+    end_date : date or None
+        Only include publications on or before this date
+    nif_assoc : int or None
+        Only include publications with this NIF association
+    with_researchers : bool
+        Whether to eagerly load the Scopus authors and researchers of each
+        publication
+
+    Returns
+    -------
+    sqlalchemy.orm.Query
+        The query for the publications
+    """
+    query = filter_publications(Publication.query, start_date=start_date,
+                                end_date=end_date, nif_assoc=nif_assoc)
+    if with_researchers:
+        # The 'researcher' backref is only added to ScopusAuthor once the
+        # mappers have been configured
+        orm.configure_mappers()
+        query = query.options(
+            orm.selectinload(Publication.scopus_authors).joinedload(
+                ScopusAuthor.researcher))
+    return query
+
+
+def stream(query, batch_size=STREAM_BATCH_SIZE):
+    """
+    Iterate over the results of a query in batches from a server-side cursor
+    (where supported by the database driver), so that memory use doesn't grow
+    with the number of results and the first rows are available immediately
+    """
+    return query.execution_options(stream_results=True).yield_per(batch_size)
+
+
+def iter_publication_rows(columns, start_date=None, end_date=None,
+                          nif_assoc=None, order_by=(),
+                          batch_size=STREAM_BATCH_SIZE):
+    """
+    Stream selected columns of publications without loading full ORM objects
+
+    Parameters
+    ----------
+    columns : list[str]
+        Names of the Publication columns to select
+    start_date : date or None
+        Only include publications on or after this date
+    end_date : date or None
+        Only include publications on or before this date
+    nif_assoc : int or None
+        Only include publications with this NIF association
+    order_by : list[str]
+        Names of the columns to order the rows by
+    batch_size : int
+        Number of rows fetched from the database at a time
+
+    Yields
+    ------
+    Row
+        Named tuples of the selected column values
+    """
+    query = db.session.query(*(getattr(Publication, c) for c in columns))
+    query = filter_publications(query, start_date=start_date,
+                                end_date=end_date, nif_assoc=nif_assoc)
+    query = query.order_by(*(getattr(Publication, c) for c in order_by))
+    yield from stream(query, batch_size=batch_size)
@@ -0,0 +1,101 @@
+"""
+Access to the Elsevier (Scopus/ScienceDirect) APIs shared by the harvesting and
+content downloading code
+"""
+import math
+import hashlib
+from functools import lru_cache
+import redis
+import pybliometrics.scopus as sc
+from app import app
+from app.utils.rate_limit import RateLimiter, RedisRateLimiter
+
+# Default throttling rates (requests/second) of the Elsevier APIs for each
+# endpoint, can be overridden by the ELSEVIER_RATE_LIMITS config option
+DEFAULT_RATE_LIMITS = {
+    'search': 9,  # Scopus Search
+    'article': 10,  # ScienceDirect article retrieval
+    'author': 3}  # Scopus author search/retrieval
+
+
+def api_key():
+    return sc.config["Authentication"]["APIKey"]
+
+
+@lru_cache()
+def redis_client():
+    """
+    Client for the Redis server the rate limits are shared through, given by
+    the RATE_LIMIT_REDIS_URL config option or the Celery broker if it is a Redis
+    server. None if neither is set
+    """
+    url = app.config.get('RATE_LIMIT_REDIS_URL')
+    if url is None:
+        broker_url = app.config.get('CELERY_BROKER_URL') or ''
+        if broker_url.startswith(('redis://', 'rediss://')):
+            url = broker_url
+    if url is None:
+        return None
+    return redis.Redis.from_url(url)
+
+
+@lru_cache()
+def elsevier_limiter(endpoint):
+    """
+    Rate limiter for calls to an endpoint of the Elsevier APIs with the current
+    API key. Shared between all processes via Redis where available, otherwise
+    only within the current process
+
+    Parameters
+    ----------
+    endpoint : str
+        The endpoint, one of 'search', 'article' or 'author'
+
+    Returns
+    -------
+    RateLimiter or RedisRateLimiter
+        The rate limiter
+    """
+    rates = dict(DEFAULT_RATE_LIMITS,
+                 **app.config.get('ELSEVIER_RATE_LIMITS', {}))
+    rate = rates[endpoint]
+    client = redis_client()
+    if client is None:
+        return RateLimiter(rate)
+    # Don't store the API key itself in Redis
+    key_hash = hashlib.sha256(api_key().encode('utf-8')).hexdigest()[:16]
+    return RedisRateLimiter(
+        client, 'ratelimit:elsevier:{}:{}'.format(key_hash, endpoint), rate)
+
+
+
+def limited_search(search_class, query, endpoint, page_size=25, **kwargs):
+    """
+    Run a pybliometrics search, waiting on the shared rate limiter of the
+    endpoint for each page of results it requests (pybliometrics requests one
+    page of `page_size` results at a time). The first page is waited for before
+    the search and the rest once the number of results is known.
+
+    Parameters
+    ----------
+    search_class : type
+        The pybliometrics search, e.g. `pybliometrics.scopus.AuthorSearch`
+    query : str
+        The search query
+    endpoint : str
+        The endpoint of the rate limiter, e.g. 'author'
+    page_size : int
+        The number of results requested per page
+    **kwargs
+        Passed through to the search
+
+    Returns
+    -------
+    The completed search
+    """
+    limiter = elsevier_limiter(endpoint)
+    limiter.wait()
+    search = search_class(query, count=page_size, **kwargs)
+    for _ in range(1, math.ceil((search.get_results_size() or 0) / page_size)):
+        limiter.wait()
+    return search
@@ -0,0 +1,245 @@
+"""
+Batched lookups of Scopus records, packing many EIDs, DOIs or author IDs into
+each OR-query of the Scopus Search API
+"""
+import logging
+from collections import namedtuple, defaultdict
+from requests.exceptions import HTTPError
+from app.exceptions import InvalidScopusQueryError
+from app.fetch import session, REQUEST_TIMEOUT
+from app.harvest import harvest, date_clause
+from app.scopus import api_key, elsevier_limiter
+from app.scopus_xml import ScopusRecord, SearchResponse  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+SCOPUS_SEARCH = "https://api.elsevier.com/content/search/scopus"
+
+# Maximum number of records returned per page with the COMPLETE view, and
+# therefore the number of EIDs/DOIs that can be looked up in a single request
+MAX_PAGE_SIZE = 25
+
+BatchLookupResult = namedtuple('BatchLookupResult', ['records', 'failed'])
+
+
+def search_pages(query, view='COMPLETE', limiter=None):
+    """
+    Get all pages of the results of a Scopus search. The pages are requested
+    with a cursor, as the Scopus Search API doesn't allow paging past the first
+    5000 results by offset.
+
+    Parameters
+    ----------
+    query : str
+        The search query
+    view : str
+        The view of the results to return
+    limiter : RateLimiter or RedisRateLimiter or None
+        Rate limiter to wait on before each request, the shared limiter of the
+        search endpoint if None
+
+    Returns
+    -------
+    list[ScopusRecord]
+        The records matching the query
+
+    Raises
+    ------
+    InvalidScopusQueryError
+        If the query is rejected (e.g. due to a malformed ID)
+    requests.exceptions.HTTPError
+        If any other search request fails
+    """
+    if limiter is None:
+        limiter = elsevier_limiter('search')
+    records = []
+    cursor = '*'
+    while True:
+        limiter.wait()
+        with session().get(
+                SCOPUS_SEARCH,
+                params={'query': query, 'view': view, 'cursor': cursor,
+                        'count': MAX_PAGE_SIZE},
+                headers={'X-ELS-APIKey': api_key(),
+                         'Accept': 'application/xml'},
+                timeout=REQUEST_TIMEOUT,
+                stream=True) as response:
+            try:
+                response.raise_for_status()
+            except HTTPError as e:
+                # The query is validated before any results are returned
+                if cursor == '*' and response.status_code == 400:
+                    raise InvalidScopusQueryError(str(e)) from e
+                raise
+            # Parse the records straight from the (decompressed) socket stream
+            response.raw.decode_content = True
+            page = SearchResponse(response.raw)
+            entries = list(page)
+        records.extend(entries)
+        if (not entries or not page.next_cursor
+                or len(records) >= (page.total_results or 0)):
+            return records
+        cursor = page.next_cursor
+
+
+def _doi_term(doi):
+    # DOIs containing characters that are special in the query syntax need to
+    # be matched as an exact phrase
+    if any(c in doi for c in '() "'):
+        return 'DOI({{{}}})'.format(doi)
+    return 'DOI({})'.format(doi)
+
+
+class BatchLookup():
+    """
+    Looks up Scopus records for arbitrary numbers of keys by chunking them into
+    OR-queries of up to `batch_size` keys, which are run concurrently. Results
+    are demultiplexed back to the keys they match, and chunks whose queries are
+    rejected (e.g. due to a malformed ID) are recursively split to isolate the
+    bad keys.
+
+    Parameters
+    ----------
+    term : callable
+        Function that takes a key and returns its term in the search query
+    match : callable
+        Function that takes a record and returns the (normalised) keys it
+        matches
+    normalise : callable
+        Function that normalises a key for comparison with the keys returned by
+        `match`
+    batch_size : int
+        The maximum number of keys per query
+    workers : int
+        The maximum number of concurrent queries
+    """
+
+    def __init__(self, term, match, normalise=str, batch_size=MAX_PAGE_SIZE,
+                 workers=4):
+        self.term = term
+        self.match = match
+        self.normalise = normalise
+        self.batch_size = batch_size
+        self.workers = workers
+
+    def query(self, keys, clause=''):
+        return '(' + ' OR '.join(self.term(k) for k in keys) + ')' + clause
+
+    def lookup(self, keys, clause='', view='COMPLETE', workers=None,
+               limiter=None):
+        """
+        Look up the records matching the keys
+
+        Parameters
+        ----------
+        keys : iterable
+            The keys to look up
+        clause : str
+            Additional clause appended to each query (e.g. date restrictions)
+        view : str
+            The view of the results to return
+        workers : int or None
+            Override the maximum number of concurrent queries
+        limiter : RateLimiter or RedisRateLimiter or None
+            Rate limiter to wait on before each request, the shared limiter of
+            the search endpoint if None
+
+        Returns
+        -------
+        BatchLookupResult
+            The records matched by each key (keys without matches map to empty
+            lists) and the exceptions raised for keys that couldn't be looked up
+        """
+        keys = list(dict.fromkeys(keys))
+        records = {k: [] for k in keys}
+        failed = {}
+        by_norm = defaultdict(list)
+        for key in keys:
+            by_norm[self.normalise(key)].append(key)
+        chunks = [tuple(keys[i:i + self.batch_size])
+                  for i in range(0, len(keys), self.batch_size)]
+        # Requests are rate-limited per page within the chunk searches
+        for result in harvest(
+                chunks,
+                search=lambda c: self._lookup_chunk(c, clause, view, limiter),
+                workers=(workers or self.workers)):
+            if result.error is not None:
+                failed.update((k, result.error) for k in result.key)
+                continue
+            chunk_records, chunk_failed = result.results
+            failed.update(chunk_failed)
+            for record in chunk_records:
+                for norm in self.match(record):
+                    for key in by_norm.get(norm, ()):
+                        if key not in failed:
+                            records[key].append(record)
+        for key in failed:
+            del records[key]
+        return BatchLookupResult(records, failed)
+
+    def _lookup_chunk(self, chunk, clause, view, limiter):
+        try:
+            return search_pages(self.query(chunk, clause), view=view,
+                                limiter=limiter), {}
+        except HTTPError as e:
+            return [], {k: e for k in chunk}
+        except InvalidScopusQueryError as e:
+            if len(chunk) == 1:
+                logger.warning("Invalid Scopus lookup key '%s': %s", chunk[0], e)
+                return [], {chunk[0]: e}
+            # Split the chunk in two to isolate the invalid keys
+            mid = len(chunk) // 2
+            records, failed = self._lookup_chunk(chunk[:mid], clause, view,
+                                                 limiter)
+            more_records, more_failed = self._lookup_chunk(chunk[mid:], clause,
+                                                           view, limiter)
+            failed.update(more_failed)
+            return records + more_records, failed
+
+
+eid_lookup = BatchLookup(
+    term=lambda eid: 'EID({})'.format(eid),
+    match=lambda r: [r.eid])
+
+doi_lookup = BatchLookup(
+    term=_doi_term,
+    match=lambda r: [r.doi.lower()] if r.doi else [],
+    normalise=lambda doi: doi.lower())
+
+# The results of author queries aren't limited to one page per key, so the
+# batch size determines how many authors' publications are paged through per
+# query rather than being limited by the page size
+author_lookup = BatchLookup(
+    term=lambda author_id: 'AU-ID({})'.format(author_id),
+    match=lambda r: (r.author_ids or '').split(';'))
+
+
+def lookup_eids(eids, **kwargs):
+    """
+    Look up Scopus records by EID (e.g. '2-s2.0-84953366816')
+    """
+    return eid_lookup.lookup(eids, **kwargs)
+
+
+def lookup_dois(dois, **kwargs):
+    """
+    Look up Scopus records by DOI (matched case-insensitively)
+    """
+    return doi_lookup.lookup(dois, **kwargs)
+
+
+def lookup_author_pubs(author_ids, start_date=None, end_date=None,
+                       loaded_after=None, **kwargs):
+    """
+    Look up the publications of Scopus authors within a date window
+
+    Parameters
+    ----------
+    author_ids : iterable[int]
+        Scopus IDs of the authors
+    start_date, end_date, loaded_after : date or None
+        The date window (see `app.harvest.date_clause`)
+    """
+    return author_lookup.lookup(
+        author_ids, clause=date_clause(start_date=start_date, end_date=end_date,
+                                       loaded_after=loaded_after), **kwargs)
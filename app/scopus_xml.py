@@ -0,0 +1,114 @@
+"""
+Incremental parser for the XML responses of the Scopus Search API, which yields
+typed records in a single pass over the response stream
+"""
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+NAMESPACES = {
+    'atom': 'http://www.w3.org/2005/Atom',
+    'prism': 'http://prismstandard.org/namespaces/basic/2.0/',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'opensearch': 'http://a9.com/-/spec/opensearch/1.1/'}
+
+# Search result record with the same fields used from the results of
+# pybliometrics.scopus.ScopusSearch, so they can be ingested interchangeably
+ScopusRecord = namedtuple('ScopusRecord', [
+    'eid', 'doi', 'pii', 'pubmed_id', 'title', 'coverDate', 'publicationName',
+    'issn', 'volume', 'issueIdentifier', 'openaccess', 'description',
+    'author_ids'])
+
+
+def _tag(name):
+    prefix, _, local = name.rpartition(':')
+    return '{{{}}}{}'.format(NAMESPACES[prefix or 'atom'], local)
+
+
+# Map of the qualified tags of the child elements of each entry onto the fields
+# of the record
+FIELD_TAGS = {_tag(t): f for t, f in [
+    ('eid', 'eid'),
+    ('prism:doi', 'doi'),
+    ('pii', 'pii'),
+    ('pubmed-id', 'pubmed_id'),
+    ('dc:title', 'title'),
+    ('prism:coverDate', 'coverDate'),
+    ('prism:publicationName', 'publicationName'),
+    ('prism:issn', 'issn'),
+    ('prism:volume', 'volume'),
+    ('prism:issueIdentifier', 'issueIdentifier'),
+    ('openaccess', 'openaccess'),
+    ('dc:description', 'description')]}
+
+ENTRY_TAG = _tag('entry')
+ERROR_TAG = _tag('error')
+AUTHOR_TAG = _tag('author')
+AUTHID_TAG = _tag('authid')
+TOTAL_RESULTS_TAG = _tag('opensearch:totalResults')
+CURSOR_TAG = _tag('cursor')
+
+
+def record_from_element(entry):
+    """
+    Create a record from an <entry> element of a search response
+    """
+    values = dict.fromkeys(ScopusRecord._fields)
+    author_ids = []
+    for child in entry:
+        if child.tag == AUTHOR_TAG:
+            authid = child.findtext(AUTHID_TAG)
+            if authid:
+                author_ids.append(authid)
+        else:
+            try:
+                values[FIELD_TAGS[child.tag]] = child.text
+            except KeyError:
+                pass
+    values['author_ids'] = ';'.join(author_ids) or None
+    return ScopusRecord(**values)
+
+
+class SearchResponse():
+    """
+    Iterates over the records in the XML response of a Scopus search as it is
+    parsed from the stream, discarding each entry once it has been converted
+    so memory use is bounded by the size of a single entry
+
+    Parameters
+    ----------
+    stream : file-like
+        The (binary) response stream
+
+    Attributes
+    ----------
+    total_results : int or None
+        The total number of results matching the search (across all pages),
+        available once the header of the response has been parsed
+    next_cursor : str or None
+        The cursor of the next page of results, if the search was made with a
+        cursor, available once the header of the response has been parsed
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.total_results = None
+        self.next_cursor = None
+
+    def __iter__(self):
+        depth = 0
+        for event, elem in ET.iterparse(self.stream, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == ENTRY_TAG:
+                    depth += 1
+                continue
+            if elem.tag == TOTAL_RESULTS_TAG:
+                self.total_results = int(elem.text)
+            elif elem.tag == CURSOR_TAG:
+                self.next_cursor = elem.get('next')
+            elif elem.tag == ENTRY_TAG:
+                depth -= 1
+                if elem.find(ERROR_TAG) is None:
+                    yield record_from_element(elem)
+                elem.clear()
+            elif depth == 0:
+                elem.clear()
@@ -1,5 +1,6 @@
 from celery.schedules import crontab
 from app import celery
+from .pipeline import refresh_publications, retry_missing_content
 
 
 @celery.on_after_configure.connect
@@ -7,6 +8,17 @@ def schedule(sender, **kwargs):  # pylint: disable=unused-argument
     """
     Specify frequency of periodic tasks
     """
+    # Harvest new publications for the current year, then fetch their content
+    # and classify them
+    sender.add_periodic_task(
+        crontab(minute=0, hour=2),
+        refresh_publications.s(),
+        name='refresh_publications')
+    # Retry downloading content that couldn't be accessed previously
+    sender.add_periodic_task(
+        crontab(minute=0, hour=3, day_of_week=0),
+        retry_missing_content.s(),
+        name='retry_missing_content')
     # Email summary of reports for each affiliation
     # sender.add_periodic_task(
     #     crontab(minute=0, hour=9, day_of_month=1),
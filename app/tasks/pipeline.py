@@ -0,0 +1,193 @@
+"""
+Celery tasks implementing the publication pipeline (add_pubs -> add_content ->
+guess_nif_assoc) so that it can be fanned out across the worker replicas
+"""
+import logging
+from datetime import date, datetime
+from celery import chord, group
+from app import celery, db
+from app.models import Researcher, ScopusAuthor, Publication
+from app.harvest import sync_window, mark_synced
+from app.ingest import ingest_publications
+from app.fetch import fetch_content, failure_reason, FetchResult
+from app.fetch_stats import load_strategy_stats, save_attempts
+from app.classify import classify_stored, default_scanner
+from app.scopus_batch import lookup_author_pubs
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_date(date_str, default):
+    if date_str is None:
+        return default
+    return date.fromisoformat(date_str)
+
+
+@celery.task
+def harvest_author(scopus_author_id, start_date=None, end_date=None,
+                   full=False):
+    """
+    Add the publications of a Scopus author to the database
+
+    Parameters
+    ----------
+    scopus_author_id : int
+        The database ID of the Scopus author
+    start_date : str or None
+        The start of the date range to harvest (ISO format), the start of the
+        current year if None
+    end_date : str or None
+        The end of the date range to harvest (ISO format), open-ended if None
+        (in which case the high-water mark of the author's sync is updated, so
+        records dated after it mustn't be skipped)
+    full : bool
+        Search the whole date range instead of only the records loaded since
+        the last sync
+
+    Returns
+    -------
+    list[int]
+        The IDs of the publications added
+    """
+    synced_at = datetime.now()
+    start = _parse_date(start_date, date(date.today().year, 1, 1))
+    end = _parse_date(end_date, None)
+    author = ScopusAuthor.query.get(scopus_author_id)
+    window = sync_window(author, start, end, full=full)
+    start_str = start.isoformat()
+    end_str = end.isoformat() if end is not None else None
+    # A failure must not fail the chord, or the publications added for the
+    # other authors would never be processed
+    try:
+        result = lookup_author_pubs([author.scopus_id], workers=1, **window)
+        if author.scopus_id in result.failed:
+            raise result.failed[author.scopus_id]
+        pubs = result.records[author.scopus_id]
+        new_pub_ids = ingest_publications(
+            p for p in pubs if start_str <= p.coverDate
+            and (end_str is None or p.coverDate <= end_str))
+        if end_date is None:
+            mark_synced(author, synced_at, window)
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.exception("Failed to add the publications of '%s'",
+                         author.name)
+        return []
+    logger.info("Added %s new publications for '%s'", len(new_pub_ids),
+                author.name)
+    return new_pub_ids
+
+
+@celery.task
+def fetch_publication_content(pub_id):
+    """
+    Download the content of a publication if it hasn't been already
+
+    Returns
+    -------
+    int
+        The ID of the publication (so that it can be chained into
+        `classify_publication`)
+    """
+    pub = Publication.query.get(pub_id)
+    if not pub.has_content:
+        status, content, attempts, error = fetch_content(
+            pub.pii, pub.doi, pub.title, issn=pub.issn,
+            stats=load_strategy_stats())
+        result = FetchResult(pub.id, status, content, error, attempts)
+        pub.access_status = result.access_status
+        if result.content is not None:
+            pub.content = result.content
+        else:
+            pub.record_content_failure(failure_reason(result))
+        save_attempts(result.attempts)
+        db.session.commit()
+    return pub_id
+
+
+@celery.task
+def classify_publication(pub_id, force=False):
+    """
+    Guess whether a publication is associated with NIF from its content, unless
+    the content has already been classified with the current rules
+    """
+    pub = Publication.query.get(pub_id)
+    rules_version = default_scanner().version
+    if not pub.has_content or (not force
+                               and pub.is_classified(rules_version)):
+        return
+    _, likelihood, _, checksum = classify_stored((pub.id, pub.content_key))
+    if likelihood is None:
+        return
+    pub.nif_assoc = pub.classified_nif_assoc = likelihood
+    pub.classified_checksum = checksum
+    pub.classified_rules = rules_version
+    db.session.commit()
+
+
+@celery.task
+def process_publications(pub_id_lists):
+    """
+    Fetch the content of and classify the publications added by the harvesting
+    tasks, fanned out per publication
+
+    Parameters
+    ----------
+    pub_id_lists : list[list[int]]
+        The IDs of the publications added by each harvesting task
+    """
+    pub_ids = sorted(set(i for ids in pub_id_lists for i in ids))
+    group(fetch_publication_content.si(i) | classify_publication.s()
+          for i in pub_ids).apply_async()
+    return pub_ids
+
+
+def harvest_signatures(scopus_author_ids, start_date=None, end_date=None,
+                       full=False):
+    return [harvest_author.si(i, start_date=start_date, end_date=end_date,
+                              full=full)
+            for i in scopus_author_ids]
+
+
+@celery.task
+def refresh_researcher(researcher_id, start_date=None, end_date=None,
+                       full=False):
+    """
+    Harvest, fetch content for and classify the publications of a researcher,
+    fanning the harvest out over each of their Scopus authors
+    """
+    researcher = Researcher.query.get(researcher_id)
+    chord(harvest_signatures((a.id for a in researcher.scopus_authors),
+                             start_date=start_date, end_date=end_date,
+                             full=full),
+          process_publications.s()).apply_async()
+
+
+@celery.task
+def refresh_publications(start_date=None, end_date=None, full=False):
+    """
+    Harvest, fetch content for and classify the publications of all researchers
+    in the database, fanned out per Scopus author and then per publication
+    """
+    author_ids = [i for i, in db.session.query(ScopusAuthor.id).filter(
+        ScopusAuthor.researcher_id.isnot(None))]
+    chord(harvest_signatures(author_ids, start_date=start_date,
+                             end_date=end_date, full=full),
+          process_publications.s()).apply_async()
+
+
+@celery.task
+def retry_missing_content(year=None):
+    """
+    Attempt to fetch (and then classify) content for publications from the
+    given year (the current year if None) that don't have any yet and are due
+    to be retried
+    """
+    if year is None:
+        year = date.today().year
+    query = db.session.query(Publication.id).filter(
+        Publication.content_available.isnot(True),
+        Publication.content_retry_due(),
+        db.extract('year', Publication.date) == year)
+    return process_publications([[i for i, in query]])
@@ -0,0 +1,205 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Request headers that change the content of the response and therefore need
+# to be part of the cache key
+KEY_HEADERS = ('Accept', 'Accept-Language')
+
+
+class HttpCache():
+    """
+    Persistent cache of HTTP GET responses stored in a SQLite database.
+
+    Entries are keyed on the URL and the request headers that affect the content
+    of the response. Fresh entries (younger than `ttl`) are returned without
+    touching the network, stale entries with an ETag or Last-Modified header are
+    revalidated with a conditional request, and the least recently used entries
+    are evicted once the total size of the cached bodies exceeds `max_size`.
+
+    Parameters
+    ----------
+    path : str
+        Path to the SQLite database file
+    ttl : float
+        The number of seconds a cached response is considered fresh for
+    max_size : int
+        The maximum number of bytes of response bodies to keep in the cache
+    """
+
+    def __init__(self, path, ttl=30 * 24 * 60 * 60, max_size=2 * 1024 ** 3):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, "
+            "body BLOB, size INTEGER, stored_at REAL, accessed_at REAL)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_responses_accessed_at "
+            "ON responses (accessed_at)")
+        # Running total of the size of the cached bodies, so that it doesn't
+        # need to be summed over the whole cache on every store
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta SELECT 'total_size', COALESCE(SUM(size), 0) "
+            "FROM responses")
+        self._conn.commit()
+
+    @staticmethod
+    def key(url, headers=None):
+        """
+        Content-addressed key of a request
+        """
+        headers = CaseInsensitiveDict(headers or {})
+        parts = [url] + ['{}: {}'.format(h, headers[h])
+                         for h in KEY_HEADERS if h in headers]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, url, headers=None, session=None, limiter=None, **kwargs):
+        """
+        Drop-in replacement for `requests.get` that serves responses from the
+        cache where possible
+
+        Parameters
+        ----------
+        url : str
+            The URL to get
+        headers : dict
+            Request headers
+        session : requests.Session or None
+            Session to make requests with, `requests` module if None
+        limiter : RateLimiter or None
+            Rate limiter to wait on before any request over the network (i.e.
+            cache hits don't count towards the rate)
+        **kwargs
+            Passed through to the `get` call
+
+        Returns
+        -------
+        requests.Response
+            The (possibly cached) response
+        """
+        session = session if session is not None else requests
+        if limiter is not None:
+            get = session.get
+
+            def limited_get(*args, **kwargs):
+                limiter.wait()
+                return get(*args, **kwargs)
+        else:
+            limited_get = session.get
+        key = self.key(url, headers)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, status, headers, body, stored_at FROM responses "
+                "WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            cached = self._response(*row[:4])
+            if now - row[4] < self.ttl:
+                self._touch(key, now)
+                return cached
+            conditional = dict(headers or {})
+            if 'ETag' in cached.headers:
+                conditional['If-None-Match'] = cached.headers['ETag']
+            if 'Last-Modified' in cached.headers:
+                conditional['If-Modified-Since'] = cached.headers[
+                    'Last-Modified']
+            if len(conditional) > len(headers or {}):
+                response = limited_get(url, headers=conditional, **kwargs)
+                if response.status_code == 304:
+                    self._touch(key, now, revalidated=True)
+                    return cached
+            else:
+                response = limited_get(url, headers=headers, **kwargs)
+        else:
+            response = limited_get(url, headers=headers, **kwargs)
+        if response.ok:
+            self._store(key, response, now)
+        return response
+
+    def evict(self, url, headers=None):
+        """
+        Remove the cached response to a request, e.g. one that turned out not to
+        hold the expected content, so that it is requested again next time
+        """
+        with self._lock:
+            self._delete(self.key(url, headers))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.execute(
+                "UPDATE meta SET value = 0 WHERE name = 'total_size'")
+            self._conn.commit()
+
+    def _touch(self, key, now, revalidated=False):
+        with self._lock:
+            if revalidated:
+                self._conn.execute(
+                    "UPDATE responses SET accessed_at = ?, stored_at = ? "
+                    "WHERE key = ?", (now, now, key))
+            else:
+                self._conn.execute(
+                    "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                    (now, key))
+            self._conn.commit()
+
+    def _store(self, key, response, now):
+        body = response.content
+        with self._lock:
+            self._delete(key)
+            self._conn.execute(
+                "INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, response.url, response.status_code,
+                 json.dumps(dict(response.headers)), body, len(body), now, now))
+            self._conn.execute(
+                "UPDATE meta SET value = value + ? WHERE name = 'total_size'",
+                (len(body),))
+            self._evict()
+            self._conn.commit()
+
+    def _delete(self, key):
+        row = self._conn.execute(
+            "SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.execute(
+                "UPDATE meta SET value = value - ? WHERE name = 'total_size'",
+                row)
+
+    def _evict(self):
+        total = self._conn.execute(
+            "SELECT value FROM meta WHERE name = 'total_size'").fetchone()[0]
+        if total <= self.max_size:
+            return
+        evicted = []
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at"):
+            evicted.append((key,))
+            total -= size
+            if total <= self.max_size:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self._conn.execute(
+            "UPDATE meta SET value = ? WHERE name = 'total_size'", (total,))
+
+    @staticmethod
+    def _response(url, status, headers, body):
+        response = requests.Response()
+        response.url = url
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(json.loads(headers))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body  # pylint: disable=protected-access
+        return response
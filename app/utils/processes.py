@@ -0,0 +1,37 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def process_pool(max_workers):
+    """
+    Create a pool of worker processes
+
+    The scripts aren't guarded by `if __name__ == '__main__'`, so the workers
+    are forked where possible to avoid them being re-executed on spawn. As
+    forking copies only the calling thread, pools should be started before any
+    other threads are (see `start_pool`).
+
+    Parameters
+    ----------
+    max_workers : int
+        The number of worker processes
+
+    Returns
+    -------
+    concurrent.futures.ProcessPoolExecutor
+        The pool
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context('fork')
+    else:
+        mp_context = None
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context)
+
+
+def start_pool(pool):
+    """
+    Start the worker processes of a pool, which are otherwise only started when
+    the first task is submitted (e.g. from a thread while others are holding
+    locks the forked workers would inherit in their locked state)
+    """
+    pool.submit(int).result()
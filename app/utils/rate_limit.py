@@ -0,0 +1,110 @@
+import math
+import time
+import threading
+from datetime import datetime
+
+
+class RateLimiter():
+    """
+    Thread-safe limiter that spaces out calls so that no more than `rate` are
+    made per second, e.g. to stay within the quota of an Elsevier API key
+
+    Parameters
+    ----------
+    rate : float or None
+        The maximum number of calls per second. If None or 0 calls are not
+        limited
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self):
+        """
+        Block until the next call slot is available
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Atomically refills the bucket for the time elapsed since it was last used and
+# reserves a token, returning how long the caller needs to wait for it. Tokens
+# can go negative so that concurrent callers queue up behind each other. Uses
+# the Redis server clock so that limits are consistent between hosts.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+end
+tokens = tokens - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], 8 * 24 * 60 * 60)
+return tostring(wait)
+"""
+
+
+class RedisRateLimiter():
+    """
+    Token-bucket rate limiter whose state is shared in Redis, so that the rate
+    is limited across all threads, processes and hosts using the same key (e.g.
+    the Celery workers sharing an Elsevier API key). Also counts the number of
+    calls made each week.
+
+    Parameters
+    ----------
+    redis : redis.Redis
+        The Redis client
+    key : str
+        The key of the bucket in Redis
+    rate : float
+        The rate tokens are added to the bucket (i.e. calls per second)
+    burst : int or None
+        The capacity of the bucket, i.e. the number of calls that can be made
+        at once after a period of inactivity. Defaults to `rate` (rounded up)
+    """
+
+    def __init__(self, redis, key, rate, burst=None):
+        self.redis = redis
+        self.key = key
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, math.ceil(rate))
+        self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    @property
+    def usage_key(self):
+        year, week, _ = datetime.utcnow().isocalendar()
+        return '{}:usage:{}-W{:02}'.format(self.key, year, week)
+
+    def wait(self):
+        """
+        Block until a token is available in the shared bucket
+        """
+        delay = float(self._script(keys=[self.key, self.usage_key],
+                                   args=[self.rate, self.burst]))
+        if delay > 0:
+            time.sleep(delay)
+
+    def usage(self):
+        """
+        The number of calls made so far this week (UTC ISO week)
+        """
+        return int(self.redis.get(self.usage_key) or 0)
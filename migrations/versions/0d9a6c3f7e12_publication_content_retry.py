@@ -0,0 +1,34 @@
+"""Add tracking of failed content downloads and their retry schedule to publications
+
+Revision ID: 0d9a6c3f7e12
+Revises: e83f51c6a2d7
+Create Date: 2026-10-17 17:12:45.093318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0d9a6c3f7e12'
+down_revision = 'e83f51c6a2d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('publications', sa.Column('content_failures', sa.Integer(), nullable=True))
+    op.add_column('publications', sa.Column('content_failed_at', sa.DateTime(), nullable=True))
+    op.add_column('publications', sa.Column('content_failure_reason', sa.String(length=200),
+                                            nullable=True))
+    op.add_column('publications', sa.Column('content_retry_after', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_publications_content_retry_after'), 'publications',
+                    ['content_retry_after'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_publications_content_retry_after'), table_name='publications')
+    op.drop_column('publications', 'content_retry_after')
+    op.drop_column('publications', 'content_failure_reason')
+    op.drop_column('publications', 'content_failed_at')
+    op.drop_column('publications', 'content_failures')
@@ -0,0 +1,34 @@
+"""Add sync high-water marks for Scopus authors
+
+Revision ID: 3c9e2f61a4b7
+Revises: 71b53d8c1d02
+Create Date: 2026-10-17 09:12:41.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e2f61a4b7'
+down_revision = '71b53d8c1d02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'scopusauthor_syncs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('scopusauthor_id', sa.Integer(), nullable=True),
+        sa.Column('last_synced', sa.DateTime(), nullable=True),
+        sa.Column('synced_from', sa.Date(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ['scopusauthor_id'], ['scopusauthors.id'],
+            name='fk_scopusauthorsyncs_scopusauthor'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('scopusauthor_id'))
+
+
+def downgrade():
+    op.drop_table('scopusauthor_syncs')
@@ -0,0 +1,67 @@
+"""Fix type of scopusauthor_id foreign key and add indexes for reporting queries
+
+Revision ID: 5f0c8b2d9e46
+Revises: d27b5e93f018
+Create Date: 2026-10-17 11:21:55.872340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0c8b2d9e46'
+down_revision = 'd27b5e93f018'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Remove duplicate links before adding the unique index
+    op.execute(
+        "DELETE FROM scopusauthor_publication_assoc WHERE id NOT IN ("
+        "SELECT MIN(id) FROM scopusauthor_publication_assoc "
+        "GROUP BY scopusauthor_id, publication_id)")
+    with op.batch_alter_table('scopusauthor_publication_assoc') as batch_op:
+        batch_op.drop_constraint(
+            'fk_scopusauthorpublicationassoc_scopusauthor', type_='foreignkey')
+        batch_op.alter_column(
+            'scopusauthor_id', existing_type=sa.String(length=20),
+            type_=sa.Integer(), existing_nullable=True)
+        batch_op.create_foreign_key(
+            'fk_scopusauthorpublicationassoc_scopusauthor', 'scopusauthors',
+            ['scopusauthor_id'], ['id'])
+        batch_op.create_index(
+            'ix_scopusauthor_publication_assoc_scopusauthor_publication',
+            ['scopusauthor_id', 'publication_id'], unique=True)
+        batch_op.create_index(
+            op.f('ix_scopusauthor_publication_assoc_publication_id'),
+            ['publication_id'], unique=False)
+    op.create_index(op.f('ix_publications_date'), 'publications', ['date'],
+                    unique=False)
+    op.create_index(op.f('ix_publications_nif_assoc'), 'publications',
+                    ['nif_assoc'], unique=False)
+    op.create_index(op.f('ix_publications_access_status'), 'publications',
+                    ['access_status'], unique=False)
+    op.create_index('ix_publications_nif_assoc_date', 'publications',
+                    ['nif_assoc', 'date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_publications_nif_assoc_date', table_name='publications')
+    op.drop_index(op.f('ix_publications_access_status'), table_name='publications')
+    op.drop_index(op.f('ix_publications_nif_assoc'), table_name='publications')
+    op.drop_index(op.f('ix_publications_date'), table_name='publications')
+    with op.batch_alter_table('scopusauthor_publication_assoc') as batch_op:
+        batch_op.drop_index(
+            op.f('ix_scopusauthor_publication_assoc_publication_id'))
+        batch_op.drop_index(
+            'ix_scopusauthor_publication_assoc_scopusauthor_publication')
+        batch_op.drop_constraint(
+            'fk_scopusauthorpublicationassoc_scopusauthor', type_='foreignkey')
+        batch_op.alter_column(
+            'scopusauthor_id', existing_type=sa.Integer(),
+            type_=sa.String(length=20), existing_nullable=True)
+        batch_op.create_foreign_key(
+            'fk_scopusauthorpublicationassoc_scopusauthor', 'scopusauthors',
+            ['scopusauthor_id'], ['id'])
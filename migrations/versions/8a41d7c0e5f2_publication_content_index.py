@@ -0,0 +1,33 @@
+"""Add content availability index columns to publications
+
+Revision ID: 8a41d7c0e5f2
+Revises: 3c9e2f61a4b7
+Create Date: 2026-10-17 10:03:27.540912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a41d7c0e5f2'
+down_revision = '3c9e2f61a4b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('publications', sa.Column('content_available', sa.Boolean(), nullable=True))
+    op.add_column('publications', sa.Column('content_format', sa.String(length=10), nullable=True))
+    op.add_column('publications', sa.Column('content_size', sa.Integer(), nullable=True))
+    op.add_column('publications', sa.Column('content_checksum', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_publications_content_available'), 'publications',
+                    ['content_available'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_publications_content_available'), table_name='publications')
+    op.drop_column('publications', 'content_checksum')
+    op.drop_column('publications', 'content_size')
+    op.drop_column('publications', 'content_format')
+    op.drop_column('publications', 'content_available')
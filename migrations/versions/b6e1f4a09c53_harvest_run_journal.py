@@ -0,0 +1,50 @@
+"""Add journal of harvesting runs so failed runs can be resumed
+
+Revision ID: b6e1f4a09c53
+Revises: 5f0c8b2d9e46
+Create Date: 2026-10-17 14:03:27.510964
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e1f4a09c53'
+down_revision = '5f0c8b2d9e46'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'harvest_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('script', sa.String(length=50), nullable=True),
+        sa.Column('arguments', sa.Text(), nullable=True),
+        sa.Column('started', sa.DateTime(), nullable=True),
+        sa.Column('finished', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'))
+    op.create_index(op.f('ix_harvest_runs_script'), 'harvest_runs', ['script'],
+                    unique=False)
+    op.create_table(
+        'harvest_run_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('run_id', sa.Integer(), nullable=True),
+        sa.Column('kind', sa.String(length=20), nullable=True),
+        sa.Column('key', sa.String(length=100), nullable=True),
+        sa.Column('status', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('completed', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ['run_id'], ['harvest_runs.id'],
+            name='fk_harvestrunitems_harvestrun'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('run_id', 'kind', 'key',
+                            name='uq_harvest_run_items_run_kind_key'))
+
+
+def downgrade():
+    op.drop_table('harvest_run_items')
+    op.drop_index(op.f('ix_harvest_runs_script'), table_name='harvest_runs')
+    op.drop_table('harvest_runs')
@@ -0,0 +1,28 @@
+"""Add provenance of NIF association classification to publications
+
+Revision ID: d27b5e93f018
+Revises: 8a41d7c0e5f2
+Create Date: 2026-10-17 10:48:09.306154
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd27b5e93f018'
+down_revision = '8a41d7c0e5f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('publications', sa.Column('classified_nif_assoc', sa.Integer(), nullable=True))
+    op.add_column('publications', sa.Column('classified_checksum', sa.String(length=64), nullable=True))
+    op.add_column('publications', sa.Column('classified_rules', sa.String(length=16), nullable=True))
+
+
+def downgrade():
+    op.drop_column('publications', 'classified_rules')
+    op.drop_column('publications', 'classified_checksum')
+    op.drop_column('publications', 'classified_nif_assoc')
@@ -0,0 +1,37 @@
+"""Add statistics of the strategies used to download publication content
+
+Revision ID: e83f51c6a2d7
+Revises: b6e1f4a09c53
+Create Date: 2026-10-17 16:38:12.207415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e83f51c6a2d7'
+down_revision = 'b6e1f4a09c53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'fetch_strategy_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('publisher', sa.String(length=50), nullable=True),
+        sa.Column('strategy', sa.String(length=20), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('successes', sa.Integer(), nullable=True),
+        sa.Column('blocked', sa.Integer(), nullable=True),
+        sa.Column('total_latency', sa.Float(), nullable=True),
+        sa.Column('last_attempt', sa.DateTime(), nullable=True),
+        sa.Column('last_blocked', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('publisher', 'strategy',
+                            name='uq_fetch_strategy_stats_publisher_strategy'))
+
+
+def downgrade():
+    op.drop_table('fetch_strategy_stats')
@@ -12,6 +12,7 @@ from sqlalchemy import orm
 sys.path.append(str(Path(__file__).parent.parent))
 from app import app, db
 from app.models import Researcher, ScopusAuthor, Affiliation
+from app.scopus import limited_search
 
 
 AUTHORS = [
@@ -62,16 +63,16 @@ with app.app_context():
 
     all_authors = set(
         a
-        for a in sc.AuthorSearch(
-            "authfirst({}) and authlast({})".format(first, last)
+        for a in limited_search(
+            sc.AuthorSearch, "authfirst({}) and authlast({})".format(first, last), "author"
         ).authors
         if a.givenname.lower().startswith(first.lower())
     )
     # Add in initials
     all_authors |= set(
         a
-        for a in sc.AuthorSearch(
-            "authfirst({}.) and authlast({})".format(first[0], last)
+        for a in limited_search(
+            sc.AuthorSearch, "authfirst({}.) and authlast({})".format(first[0], last), "author"
         ).authors
         if a.givenname.lower().startswith(first[0] + ".") or a.givenname.lower().startswith(first)
     )
@@ -3,22 +3,12 @@
 Script to download full text articles for publications so they can be searced
 for key terms
 """
-import os.path
-import json
 import logging
 import sys
-import io
 from pathlib import Path
 from datetime import date
-from fuzzywuzzy import fuzz
 from argparse import ArgumentParser
-from urllib.parse import unquote as unquote_url
-import requests
 from sqlalchemy import sql
-from requests.exceptions import ConnectionError
-from PyPDF2 import PdfFileReader
-from bs4 import BeautifulSoup
-import pybliometrics.scopus as sc
 
 pkg_dir = str(Path(__file__).parent.parent)
 print(f"Adding {pkg_dir} to path")
@@ -27,12 +17,11 @@ sys.path.append(pkg_dir)
 
 from app import db, app  # noqa
 from app.models import Publication  # noqa
-from app.constants import (  # noqa
-    CANT_ACCESS_CONTENT,
-    PLAIN_TEXT_ACCESS_CONTENT,
-    HTML_ACCESS_CONTENT,
-    UNKNOWN_ACCESS_CONTENT,
-)  # PDF_ACCESS_CONTENT,
+from app.fetch import fetch_contents, failure_reason  # noqa
+from app.fetch_stats import load_strategy_stats, save_attempts  # noqa
+from app.journal import (  # noqa
+    start_run, run_arguments, completed_keys, failed_keys, record_item,
+    finish_run)
 
 
 logging.basicConfig()
@@ -50,113 +39,92 @@ parser.add_argument(
     default=date.today().year,
     help="The year to get the publication content from",
 )
+parser.add_argument(
+    "--jobs",
+    type=int,
+    default=16,
+    help="The number of publications to download concurrently",
+)
+parser.add_argument(
+    "--retry-all",
+    action="store_true",
+    default=False,
+    help=(
+        "Retry publications whose content previously failed to download even if "
+        "they aren't due to be retried yet"
+    ),
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    default=False,
+    help=(
+        "Resume the last run that didn't finish (with its options), skipping the "
+        "publications it already attempted to download"
+    ),
+)
 args = parser.parse_args()
 
-DOI_RESOLVER = "http://doi.org/"
-SCIENCE_DIRECT = "http://api.elsevier.com/content/article/pii/"
-CROSSREF = "https://api.wiley.com/onlinelibrary/tdm/v1/articles/"
-
-crossref_config = os.path.join(os.environ["HOME"], ".crossref", "config.json")
-
-USER_AGENT_HEADER = {
-    "User-Agent": (
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/50.0.2661.102 Safari/537.36"
-    )
-}
-
-if os.path.exists(crossref_config):
-    with open(crossref_config) as f:
-        crossref_token = json.load(f)["APIToken"]
-
-
-def content_from_doi(doi, pub):
-    try:
-        response = requests.get(DOI_RESOLVER + doi, headers=USER_AGENT_HEADER)
-    except ConnectionError:
-        return None
-    html = BeautifulSoup(response.text, features="lxml")
-    redirect_tag = html.find(id="redirectURL")
-    if redirect_tag:
-        redirect_url = unquote_url(redirect_tag.attrs["value"])
-        html = BeautifulSoup(requests.get(redirect_url).text, features="lxml")
-    if html.find("title").text.startswith("Attention Required!"):
-        return None
-    if not html.find(text=lambda s: fuzz.ratio(pub.title, s.strip()) > 60):
-        #     or not html.body.find(text=re.compile('.*methods.*', flags=re.IGNORECASE))):
-        # with open('/Users/tclose/Desktop/doi-content.html', 'w') as f:
-        #     f.write(response.text)
-        return None
-        # return content_from_crossref(doi)
-    return html
-
-
-def content_from_crossref(doi):
-    response = requests.get(
-        CROSSREF + doi,
-        headers={
-            "CR-Clickthrough-Client-Token": crossref_token,
-            "Accept": "application/pdf",
-        },
-    )
-    pdf = PdfFileReader(io.BytesIO(response.content))
-    text = ""
-    for page in pdf.pages:
-        text += page.extractText()
-    return text
-
-
-def content_from_pii(pii):
-    response = requests.get(
-        SCIENCE_DIRECT + pii,
-        headers={
-            "X-ELS-APIKey": sc.config["Authentication"]["APIKey"],
-            "Accept": "application/json",
-        },
+with app.app_context():
+    run = start_run(
+        "add_content",
+        {"new": args.new, "year": args.year, "retry_all": args.retry_all},
+        resume=args.resume,
     )
-    text = None
-    if response.ok:
-        try:
-            text = response.json()["full-text-retrieval-response"]["originalText"]
-        except KeyError:
-            pass
-    return text
-
+    if args.resume:
+        vars(args).update(run_arguments(run))
+        logging.info(f"Resuming run {run.id} started at {run.started}")
+    completed = completed_keys(run, "publication")
 
-with app.app_context():
     pub_query = Publication.query
     if args.new:
         pub_query = pub_query.filter(Publication.access_status == None)
     if args.year:
         pub_query = pub_query.filter(sql.extract("year", Publication.date) == args.year)
 
-    results = pub_query.all()
-
-    for pub in results:
-        if not pub.has_content:
-            if pub.pii:
-                content = content_from_pii(pub.pii)
-                if content is None:
-                    pub.access_status = CANT_ACCESS_CONTENT
-                else:
-                    pub.access_status = PLAIN_TEXT_ACCESS_CONTENT
-            elif pub.doi:
-                content = content_from_doi(pub.doi, pub)
-                if content is None:
-                    pub.access_status = CANT_ACCESS_CONTENT
-                else:
-                    pub.access_status = HTML_ACCESS_CONTENT
-            else:
-                pub.access_status = UNKNOWN_ACCESS_CONTENT
-
-            # if content:
-            # pub.content = content
-            db.session.commit()
-            if pub.access_status in (1, 2):
-                status = "Successfully"
-            elif pub.access_status == 0:
-                status = "Unsuccessfully"
-            elif pub.access_status == -1:
-                status = "No method for"
-            logging.info(f"{status} accessed content for {pub.id} ({pub.scopus_id}")
+    pub_query = pub_query.filter(Publication.content_available.isnot(True))
+    if not args.retry_all:
+        # Skip publications that failed recently (e.g. paywalled content) until
+        # their retry is due, apart from those whose downloads raised errors in
+        # the run being resumed
+        retry_ids = [int(key) for key in failed_keys(run, "publication")]
+        pub_query = pub_query.filter(
+            sql.or_(Publication.content_retry_due(), Publication.id.in_(retry_ids))
+        )
+    pubs = {
+        pub.id: pub
+        for pub in pub_query.all()
+        if str(pub.id) not in completed and not pub.has_content
+    }
+
+    stats = load_strategy_stats()
+    for result in fetch_contents(
+        ((p.id, p.pii, p.doi, p.title, p.issn) for p in pubs.values()),
+        workers=args.jobs,
+        stats=stats,
+    ):
+        pub = pubs[result.key]
+        pub.access_status = result.access_status
+        if result.content is not None:
+            pub.content = result.content
+        else:
+            pub.record_content_failure(failure_reason(result))
+        # Downloads that raised errors (as opposed to content that couldn't be
+        # accessed) are retried when the run is resumed
+        record_item(run, "publication", pub.id, error=result.error)
+        save_attempts(result.attempts, stats=stats)
+        db.session.commit()
+        if pub.access_status in (1, 2, 3):
+            status = "Successfully"
+        elif pub.access_status == 0:
+            status = "Unsuccessfully"
+        elif pub.access_status == -1:
+            status = "No method for"
+        logging.info(f"{status} accessed content for {pub.id} ({pub.scopus_id}")
+
+    num_failed = finish_run(run)
+    if num_failed:
+        logging.warning(
+            f"Downloads of {num_failed} publications failed, rerun with --resume "
+            "to retry them"
+        )
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 from datetime import datetime
+from collections import defaultdict
 from argparse import ArgumentParser
-from sqlalchemy import orm, or_
-import pybliometrics.scopus as sc
 from app import app, db
-from app.models import Researcher, Publication, ScopusAuthor
+from app.models import Researcher
+from app.scopus import elsevier_limiter
+from app.utils.rate_limit import RateLimiter
+from app.harvest import sync_window, mark_synced
+from app.scopus_batch import author_lookup, lookup_author_pubs
+from app.ingest import chunks, ingest_publications
+from app.journal import (
+    start_run, run_arguments, completed_keys, record_item, finish_run)
 
 
 parser = ArgumentParser(__doc__)
@@ -20,71 +26,151 @@ parser.add_argument(
     default=None,
     help="The year to search for (YYYY-MM-DD format)",
 )
+parser.add_argument(
+    "--workers",
+    type=int,
+    default=8,
+    help="The number of batched Scopus searches to run concurrently",
+)
+parser.add_argument(
+    "--rate",
+    type=float,
+    default=None,
+    help=(
+        "The maximum number of Scopus requests per second (defaults to the "
+        "'search' limit of the ELSEVIER_RATE_LIMITS config option, shared with "
+        "other harvesters via Redis)"
+    ),
+)
+parser.add_argument(
+    "--batch-size",
+    type=int,
+    default=500,
+    help="The number of new publications to insert per database transaction",
+)
+parser.add_argument(
+    "--full",
+    action="store_true",
+    default=False,
+    help=(
+        "Re-download the full publication history of each author within the "
+        "date range instead of only the records loaded since the last sync"
+    ),
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    default=False,
+    help=(
+        "Resume the last run that didn't finish (with its date range), skipping "
+        "the authors whose publications it already added"
+    ),
+)
 args = parser.parse_args()
 
 
 DATE_FORMAT = "%Y-%m-%d"
 
-if args.start_date:
-    start_date = datetime.strptime(args.start_date, DATE_FORMAT)
-else:
-    start_date = datetime.time(year=1900)
-if args.end_date:
-    end_date = datetime.strptime(args.end_date, DATE_FORMAT)
-else:
-    end_date = datetime.today()
-
 with app.app_context():
-    for researcher in Researcher.query.all():
-        for author in researcher.scopus_authors:
-            search_str = f"au-id({author.scopus_id})"
-            author_pubs = sc.ScopusSearch(search_str, timeout=3000).results
-            print(f"Found {len(author_pubs)} publications in total for '{author.name}'")
-            author_pubs_in_range = [
-                p
-                for p in author_pubs
-                if (
-                    datetime.strptime(p.coverDate, DATE_FORMAT) >= start_date
-                    and datetime.strptime(p.coverDate, DATE_FORMAT) <= end_date
+    run = start_run(
+        "add_pubs",
+        {"start_date": args.start_date, "end_date": args.end_date, "full": args.full},
+        resume=args.resume,
+    )
+    if args.resume:
+        vars(args).update(run_arguments(run))
+        print(f"Resuming run {run.id} started at {run.started}")
+    run_started = run.started
+
+    if args.start_date:
+        start_date = datetime.strptime(args.start_date, DATE_FORMAT)
+    else:
+        start_date = datetime(year=1900, month=1, day=1)
+    # Open-ended syncs aren't bounded by the date of the run, as records dated
+    # in the future (e.g. early access) wouldn't be requested again by the next
+    # incremental sync
+    if args.end_date:
+        end_date = datetime.strptime(args.end_date, DATE_FORMAT)
+    else:
+        end_date = None
+
+    completed = completed_keys(run, "author")
+    authors = {
+        a.scopus_id: a
+        for r in Researcher.query.all()
+        for a in r.scopus_authors
+        if str(a.scopus_id) not in completed
+    }
+    search_kwargs = {
+        scopus_id: sync_window(
+            author, start_date.date(), end_date and end_date.date(), full=args.full
+        )
+        for scopus_id, author in authors.items()
+    }
+
+    # Share the search quota of the API key with any other harvesters unless a
+    # rate has been explicitly given
+    limiter = RateLimiter(args.rate) if args.rate else elsevier_limiter("search")
+    # Dates are in ISO format so can be compared as strings without parsing
+    start_str = start_date.strftime(DATE_FORMAT)
+    end_str = end_date.strftime(DATE_FORMAT) if end_date else None
+
+    # Authors with the same search window are looked up together in batched
+    # OR-queries
+    windows = defaultdict(list)
+    for scopus_id, window in search_kwargs.items():
+        windows[tuple(sorted(window.items()))].append(scopus_id)
+
+    def in_range(author, author_pubs):
+        print(f"Found {len(author_pubs)} new publications in total for '{author.name}'")
+        author_pubs_in_range = [
+            p
+            for p in author_pubs
+            if start_str <= p.coverDate and (end_str is None or p.coverDate <= end_str)
+        ]
+        print(
+            f"Found {len(author_pubs_in_range)} publications between {args.start_date} "
+            f"and {args.end_date} for '{author.name}'"
+        )
+        return author_pubs_in_range
+
+    # Authors are journalled as completed once their publications have been
+    # added, in groups small enough that little is repeated if the run fails
+    group_size = args.workers * author_lookup.batch_size
+    num_new_pubs = 0
+    for window, window_author_ids in windows.items():
+        for author_ids in chunks(window_author_ids, group_size):
+            result = lookup_author_pubs(
+                author_ids, workers=args.workers, limiter=limiter, **dict(window)
+            )
+            for scopus_id, error in result.failed.items():
+                print(
+                    f"Could not retrieve publications for '{authors[scopus_id].name}': "
+                    f"{error}"
                 )
-            ]
-            print(
-                f"Found {len(author_pubs_in_range)} publications between {args.start_date} "
-                f"and {args.end_date} for '{author.name}'"
+                record_item(run, "author", scopus_id, error=error)
+            new_pub_ids = ingest_publications(
+                (
+                    p
+                    for scopus_id, author_pubs in result.records.items()
+                    for p in in_range(authors[scopus_id], author_pubs)
+                ),
+                batch_size=args.batch_size,
             )
-            for pub in author_pubs_in_range:
-                scopus_id = pub.eid.split("-")[-1]
-                if pub.doi:
-                    pub_filter = or_(
-                        Publication.scopus_id == scopus_id,
-                        Publication.doi == pub.doi,
-                    )
-                else:
-                    pub_filter = Publication.scopus_id == scopus_id
-                publication = Publication.query.filter(pub_filter).one_or_none()
-                if publication is None:
-                    publication = Publication(
-                        date=datetime.strptime(pub.coverDate, DATE_FORMAT).date(),
-                        doi=pub.doi,
-                        scopus_id=scopus_id,
-                        pii=pub.pii,
-                        title=pub.title,
-                        pubmed_id=pub.pubmed_id,
-                        volume=pub.volume,
-                        pub_name=pub.publicationName,
-                        openaccess=(pub.openaccess == "1"),
-                        issue_id=pub.issueIdentifier,
-                        abstract=pub.description,
-                        issn=pub.issn,
-                    )
-                    for pub_author in pub.author_ids.split(";"):
-                        try:
-                            scopus_author = ScopusAuthor.query.filter_by(
-                                scopus_id=int(pub_author)
-                            ).one()
-                        except orm.exc.NoResultFound:
-                            pass
-                        else:
-                            publication.scopus_authors.append(scopus_author)
-                    db.session.add(publication)
-                    db.session.commit()
+            num_new_pubs += len(new_pub_ids)
+            for scopus_id in result.records:
+                record_item(run, "author", scopus_id)
+                # Only record high-water marks for open-ended syncs, as
+                # publications after the end date would otherwise be skipped by
+                # the next incremental sync
+                if not args.end_date:
+                    mark_synced(authors[scopus_id], run_started, search_kwargs[scopus_id])
+            db.session.commit()
+    print(f"Added {num_new_pubs} new publications to the database")
+
+    num_failed = finish_run(run)
+    if num_failed:
+        print(
+            f"Could not retrieve the publications of {num_failed} authors, rerun "
+            "with --resume to retry them"
+        )
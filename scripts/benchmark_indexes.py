@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark the reporting query patterns against a synthetic SQLite database with
+the schema before and after the reporting indexes were added (migration
+5f0c8b2d9e46), printing the query plans and timings of each
+"""
+import sqlite3
+import random
+import timeit
+from datetime import date, timedelta
+from argparse import ArgumentParser
+
+SCHEMA = """
+CREATE TABLE scopusauthors (id INTEGER PRIMARY KEY, scopus_id INTEGER UNIQUE);
+CREATE TABLE publications (
+    id INTEGER PRIMARY KEY, date DATE, scopus_id VARCHAR(100) UNIQUE,
+    doi VARCHAR(200) UNIQUE, title VARCHAR(500), pub_name VARCHAR(200),
+    nif_assoc INTEGER, access_status INTEGER);
+CREATE TABLE scopusauthor_publication_assoc (
+    id INTEGER PRIMARY KEY, scopusauthor_id {assoc_fk_type}
+    REFERENCES scopusauthors (id),
+    publication_id INTEGER REFERENCES publications (id));
+"""
+
+INDEXES = """
+CREATE INDEX ix_publications_date ON publications (date);
+CREATE INDEX ix_publications_nif_assoc ON publications (nif_assoc);
+CREATE INDEX ix_publications_access_status ON publications (access_status);
+CREATE INDEX ix_publications_nif_assoc_date ON publications (nif_assoc, date);
+CREATE UNIQUE INDEX ix_scopusauthor_publication_assoc_scopusauthor_publication
+    ON scopusauthor_publication_assoc (scopusauthor_id, publication_id);
+CREATE INDEX ix_scopusauthor_publication_assoc_publication_id
+    ON scopusauthor_publication_assoc (publication_id);
+"""
+
+QUERIES = {
+    'publications in date range (guess_nif_assoc.py)': (
+        "SELECT * FROM publications WHERE date >= ? AND date <= ?",
+        ('2023-01-01', '2023-12-31')),
+    'definite publications in date range (export_csv.py)': (
+        "SELECT * FROM publications WHERE nif_assoc = ? AND date >= ? "
+        "AND date <= ? ORDER BY date",
+        (50, '2023-01-01', '2023-12-31')),
+    'publications without content in year (add_content.py)': (
+        "SELECT * FROM publications WHERE access_status IS NULL "
+        "AND date >= ? AND date <= ?",
+        ('2023-01-01', '2023-12-31')),
+    'publications of an author': (
+        "SELECT p.* FROM publications p JOIN scopusauthor_publication_assoc a "
+        "ON a.publication_id = p.id WHERE a.scopusauthor_id = ?",
+        (17,)),
+    'authors of publications in date range': (
+        "SELECT a.scopusauthor_id FROM scopusauthor_publication_assoc a "
+        "JOIN publications p ON a.publication_id = p.id "
+        "WHERE p.date >= ? AND p.date <= ?",
+        ('2023-01-01', '2023-12-31'))}
+
+
+def create_db(num_pubs, num_authors, indexed):
+    conn = sqlite3.connect(':memory:')
+    conn.executescript(SCHEMA.format(
+        assoc_fk_type=('INTEGER' if indexed else 'VARCHAR(20)')))
+    rng = random.Random(0)
+    conn.executemany("INSERT INTO scopusauthors VALUES (?, ?)",
+                     ((i, 7000000 + i) for i in range(1, num_authors + 1)))
+    start = date(2000, 1, 1)
+    conn.executemany(
+        "INSERT INTO publications VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ((i, (start + timedelta(days=rng.randrange(8766))).isoformat(),
+          str(85000000000 + i), '10.1000/{}'.format(i), 'Title {}'.format(i),
+          'Journal', rng.choice((None, 10, 20, 30, 50)),
+          rng.choice((None, -1, 0, 1, 2)))
+         for i in range(1, num_pubs + 1)))
+    conn.executemany(
+        "INSERT INTO scopusauthor_publication_assoc "
+        "(scopusauthor_id, publication_id) VALUES (?, ?)",
+        set((rng.randrange(1, num_authors + 1), rng.randrange(1, num_pubs + 1))
+            for _ in range(num_pubs * 3)))
+    if indexed:
+        conn.executescript(INDEXES)
+    conn.execute("ANALYZE")
+    return conn
+
+
+parser = ArgumentParser(__doc__)
+parser.add_argument('--num_pubs', type=int, default=200000,
+                    help="Number of synthetic publications to generate")
+parser.add_argument('--num_authors', type=int, default=2000,
+                    help="Number of synthetic authors to generate")
+parser.add_argument('--repeats', type=int, default=10,
+                    help="Number of times to repeat each query")
+args = parser.parse_args()
+
+dbs = {label: create_db(args.num_pubs, args.num_authors, indexed)
+       for label, indexed in (('before', False), ('after', True))}
+
+for name, (query, params) in QUERIES.items():
+    print('\n' + name)
+    for label, conn in dbs.items():
+        plan = conn.execute('EXPLAIN QUERY PLAN ' + query, params).fetchall()
+        duration = timeit.timeit(
+            lambda: conn.execute(query, params).fetchall(),
+            number=args.repeats) / args.repeats
+        print('  {} ({:.2f} ms)'.format(label, duration * 1000))
+        for row in plan:
+            print('    ' + row[-1])
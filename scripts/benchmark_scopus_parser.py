@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark the incremental parsing of Scopus search responses (app.scopus_xml)
+against the regex start/end tag extraction of the legacy harvesting scripts, on
+recorded XML responses or synthetic ones, printing the timings and peak memory
+of each
+"""
+import io
+import re
+import timeit
+import tracemalloc
+from argparse import ArgumentParser
+from app.scopus_xml import SearchResponse
+
+# The tags extracted from each entry by the legacy scripts
+ENTRY_TAGS = [('<eid>', '</eid>'), ('<prism:doi>', '</prism:doi>'),
+              ('<pii>', '</pii>'), ('<pubmed-id>', '</pubmed-id>'),
+              ('<dc:title>', '</dc:title>'),
+              ('<prism:coverDate>', '</prism:coverDate>'),
+              ('<prism:publicationName>', '</prism:publicationName>'),
+              ('<prism:issn>', '</prism:issn>'),
+              ('<prism:volume>', '</prism:volume>'),
+              ('<prism:issueIdentifier>', '</prism:issueIdentifier>'),
+              ('<openaccess>', '</openaccess>'),
+              ('<dc:description>', '</dc:description>')]
+
+ENTRY = """<entry><link ref="self" href="https://api.elsevier.com/content/abstract/scopus_id/{id}"/>
+<prism:url>https://api.elsevier.com/content/abstract/scopus_id/{id}</prism:url>
+<dc:identifier>SCOPUS_ID:{id}</dc:identifier><eid>2-s2.0-{id}</eid>
+<dc:title>Imaging study &amp; analysis number {id}</dc:title>
+<prism:publicationName>NeuroImage</prism:publicationName>
+<prism:issn>10538119</prism:issn><prism:volume>{vol}</prism:volume>
+<prism:issueIdentifier>2</prism:issueIdentifier>
+<prism:coverDate>2023-05-01</prism:coverDate>
+<prism:doi>10.1016/j.neuroimage.2023.{id}</prism:doi>
+<pii>S10538119230{id}</pii><pubmed-id>3{id}</pubmed-id>
+<dc:description>{abstract}</dc:description><openaccess>1</openaccess>
+{authors}</entry>
+"""
+
+AUTHOR = """<author seq="{seq}">
+<author-url>https://api.elsevier.com/content/author/author_id/{id}</author-url>
+<authid>{id}</authid><authname>Author {seq}</authname><surname>Author</surname>
+<given-name>A.</given-name><initials>A.</initials><afid>60025709</afid></author>
+"""
+
+
+def synthetic_response(num_entries, num_authors):
+    entries = ''.join(
+        ENTRY.format(id=85000000000 + i, vol=i % 300,
+                     abstract='Lorem ipsum dolor sit amet. ' * 60,
+                     authors=''.join(AUTHOR.format(seq=j + 1, id=7000000 + j)
+                                     for j in range(num_authors)))
+        for i in range(num_entries))
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<search-results xmlns="http://www.w3.org/2005/Atom" '
+        'xmlns:cto="http://www.elsevier.com/xml/cto/dtd" '
+        'xmlns:atom="http://www.w3.org/2005/Atom" '
+        'xmlns:prism="http://prismstandard.org/namespaces/basic/2.0/" '
+        'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/">'
+        '<opensearch:totalResults>{}</opensearch:totalResults>'
+        '<opensearch:startIndex>0</opensearch:startIndex>'
+        '<opensearch:itemsPerPage>{}</opensearch:itemsPerPage>{}'
+        '</search-results>').format(num_entries, num_entries, entries).encode()
+
+
+def extract_xml_data(text, start_tag, end_tag):
+    # Equivalent of the legacy extract_xml_data, without the retries
+    s = [m.end(0) for m in re.finditer(start_tag, text)]
+    e = [m.start(0) for m in re.finditer(end_tag, text)]
+    if len(s) != len(e):
+        raise ValueError('Mismatch in number of {} tags'.format(start_tag))
+    return [text[i:j] for i, j in zip(s, e)]
+
+
+def regex_parse(data):
+    text = data.decode('utf-8')
+    total = int(extract_xml_data(text, '<opensearch:totalResults>',
+                                 '</opensearch:totalResults>')[0])
+    records = []
+    for entry in extract_xml_data(text, '<entry>', '</entry>'):
+        record = [next(iter(extract_xml_data(entry, start, end)), None)
+                  for start, end in ENTRY_TAGS]
+        authors = extract_xml_data(entry, '<author seq=', '</author>')
+        record.append(';'.join(
+            a for author in authors
+            for a in extract_xml_data(author, '<authid>', '</authid>')))
+        records.append(record)
+    return total, records
+
+
+def stream_parse(data):
+    response = SearchResponse(io.BytesIO(data))
+    records = list(response)
+    return response.total_results, records
+
+
+parser = ArgumentParser(__doc__)
+parser.add_argument('files', nargs='*',
+                    help="Recorded XML responses of the Scopus Search API "
+                    "(synthetic responses are generated if none are given)")
+parser.add_argument('--entries', type=int, default=25,
+                    help="Number of entries per synthetic response")
+parser.add_argument('--authors', type=int, default=20,
+                    help="Number of authors per synthetic entry")
+parser.add_argument('--repeats', type=int, default=20,
+                    help="Number of times to parse each response")
+args = parser.parse_args()
+
+if args.files:
+    responses = {}
+    for path in args.files:
+        with open(path, 'rb') as f:
+            responses[path] = f.read()
+else:
+    responses = {'synthetic': synthetic_response(args.entries, args.authors)}
+
+for name, data in responses.items():
+    print('\n{} ({:.1f} kB)'.format(name, len(data) / 1024))
+    for label, parse in (('regex', regex_parse), ('streaming', stream_parse)):
+        total, records = parse(data)
+        duration = timeit.timeit(lambda: parse(data),
+                                 number=args.repeats) / args.repeats
+        tracemalloc.start()
+        parse(data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print('  {}: {} of {} records in {:.2f} ms, peak {:.1f} kB'.format(
+            label, len(records), total, duration * 1000, peak / 1024))
@@ -5,8 +5,8 @@ import csv
 from argparse import ArgumentParser
 from datetime import datetime
 from app import app
-from app.models import Publication
-from app.constants import DEFINITE_NIF_ASSOC, NIF_ASSOC
+from app.reports import iter_publication_rows
+from app.constants import DEFINITE_NIF_ASSOC
 
 
 # OUTPUT_CSV_HEADERS = [
@@ -62,14 +62,14 @@ with app.app_context(), open(args.output_csv, 'w') as csv_f:
 
     csv_writer.writeheader()
 
-    query = (Publication.query
-             .filter(
-                 Publication.nif_assoc == DEFINITE_NIF_ASSOC,
-                 Publication.date >= start_date,
-                 Publication.date <= end_date)
-             .order_by(Publication.date))
+    rows = iter_publication_rows(
+        ['title', 'date', 'doi', 'pub_name'],
+        start_date=start_date,
+        end_date=end_date,
+        nif_assoc=DEFINITE_NIF_ASSOC,
+        order_by=['date'])
 
-    for pub in query.all():
+    for pub in rows:
         row = {
             'Subject or Title': pub.title,
             'Output Date': pub.date.strftime('%d/%m/%Y'),
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Export the publications, authors, affiliations and researchers in the database
+to Parquet files (publications partitioned by year) for analysis, e.g.
+
+    pandas.read_parquet(output_dir + '/publications', filters=[('year', '>=', 2020)])
+"""
+from argparse import ArgumentParser
+from app import app
+from app.export import export_parquet
+
+
+parser = ArgumentParser(__doc__)
+parser.add_argument('output_dir', type=str,
+                    help="Directory to write the Parquet files to")
+parser.add_argument('--batch_size', type=int, default=1000,
+                    help="Number of rows read from the database at a time")
+args = parser.parse_args()
+
+with app.app_context():
+    export_parquet(args.output_dir, batch_size=args.batch_size)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Convert the raw HTML pages downloaded for publications before the text of
+articles was extracted at download time into plain text, which is smaller to
+store and faster to scan
+"""
+import sys
+import os
+from pathlib import Path
+from argparse import ArgumentParser
+
+sys.path.append(str(Path(__file__).parent.parent))
+from app import app, db  # noqa
+from app.models import Publication  # noqa
+from app.content_store import content_store  # noqa
+from app.extract import html_to_text  # noqa
+
+
+parser = ArgumentParser(__doc__)
+parser.add_argument(
+    "--keep-html",
+    action="store_true",
+    default=False,
+    help="Keep the raw HTML in the content store alongside the extracted text",
+)
+args = parser.parse_args()
+
+with app.app_context():
+    store = content_store()
+    num_converted = num_empty = html_bytes = text_bytes = 0
+    query = Publication.query.filter(
+        Publication.content_available.isnot(False),
+        Publication.pii == None,  # noqa: E711
+        (Publication.content_format == "html") | (Publication.content_format == None),  # noqa: E711
+    )
+    for pub in query.all():
+        html_key = pub.content_key
+        html = store.read(html_key)
+        if html is None:
+            continue
+        text = html_to_text(html)
+        if not text:
+            # Leave pages that no text could be extracted from for inspection
+            num_empty += 1
+            continue
+        html_bytes += len(html.encode("utf-8"))
+        text_bytes += len(text.encode("utf-8"))
+        pub.content = text
+        db.session.commit()
+        if not args.keep_html:
+            os.remove(store.path(html_key))
+        num_converted += 1
+    print(
+        f"Extracted the text of {num_converted} publications ({html_bytes} bytes of "
+        f"HTML to {text_bytes} bytes of text), no text found in {num_empty}"
+    )
@@ -4,67 +4,15 @@ Script to download full text articles linked to facility researchers and
 search for references to NIF-related instruments
 """
 import os.path
-import json
-import io
+import sys
+from pathlib import Path
 from argparse import ArgumentParser
-from urllib.parse import unquote as unquote_url
-import requests
-from requests.exceptions import ConnectionError
-from PyPDF2 import PdfFileReader
-from bs4 import BeautifulSoup
 import pybliometrics.scopus as sc
 
-DOI_RESOLVER = 'http://doi.org/'
-SCIENCE_DIRECT = 'http://api.elsevier.com/content/article/pii/'
-CROSSREF = 'https://api.wiley.com/onlinelibrary/tdm/v1/articles/'
-
-crossref_config = os.path.join(os.environ['HOME'], '.crossref', 'config.json')
-
-if os.path.exists(crossref_config):
-    with open(crossref_config) as f:
-        crossref_token = json.load(f)['APIToken']
-
-
-def content_from_doi(doi):
-    try:
-        response = requests.get(DOI_RESOLVER + doi)
-    except ConnectionError:
-        return None
-    html = BeautifulSoup(response.text, features='lxml')
-    redirect_tag = html.find(id='redirectURL')
-    if redirect_tag:
-        redirect_url = unquote_url(redirect_tag.attrs['value'])
-        html = BeautifulSoup(requests.get(redirect_url).text,
-                             features='lxml')
-    if html.find('title').text.startswith('Attention Required!'):
-        return None
-        # return content_from_crossref(doi)
-    return html
-
-def content_from_crossref(doi):
-    response = requests.get(
-        CROSSREF + doi,
-        headers={"CR-Clickthrough-Client-Token"  : crossref_token,
-                 "Accept"        : 'application/pdf'})
-    pdf = PdfFileReader(io.BytesIO(response.content))
-    text = ''
-    for page in pdf.pages:
-        text += page.extractText()
-    return text
-
-def content_from_pii(pii):
-    response = requests.get(
-        SCIENCE_DIRECT + pii,
-        headers={"X-ELS-APIKey"  : sc.config['Authentication']['APIKey'],
-                 "Accept"        : 'application/json'})
-    text = None
-    if response.ok:
-        try:
-            text = response.json()[
-                'full-text-retrieval-response']['originalText']
-        except KeyError:
-            pass
-    return text
+sys.path.append(str(Path(__file__).parent.parent))
+from app.fetch import SCIENCE_DIRECT, content_from_doi, content_from_pii  # noqa
+from app.scopus import limited_search  # noqa
+from app.exceptions import AccessBlockedError  # noqa
 
 
 AUTHORS = [
@@ -102,12 +50,14 @@ publications = []
 
 for first, last, initials in AUTHORS:
     all_authors = set(
-        a for a in sc.AuthorSearch("authfirst({}) and authlast({})"
-                                   .format(first, last)).authors
+        a for a in limited_search(sc.AuthorSearch,
+                                  "authfirst({}) and authlast({})"
+                                  .format(first, last), 'author').authors
         if a.givenname.startswith(first))
     all_authors |= set(
-        a for a in sc.AuthorSearch("authfirst({}.) and authlast({})"
-                                   .format(first[0], last)).authors
+        a for a in limited_search(sc.AuthorSearch,
+                                  "authfirst({}.) and authlast({})"
+                                  .format(first[0], last), 'author').authors
         if a.givenname.startswith(first[0] + '.')
         or a.givenname.startswith(first))
     authors = [a for a in all_authors if a.city == 'Sydney']
@@ -122,7 +72,8 @@ for first, last, initials in AUTHORS:
     for author in authors:
         search_str = 'au-id({}) AND pubyear = 2020'.format(
             author.eid.split('-')[-1])
-        author_pubs = sc.ScopusSearch(search_str).results
+        author_pubs = limited_search(sc.ScopusSearch, search_str,
+                                     'search').results
         if author_pubs:
             publications += author_pubs
 
@@ -156,7 +107,10 @@ for pub in publications:
                 status = 'Text downloaded from PII'
                 fpath += '.txt'
         elif pub.doi:
-            content = content_from_doi(pub.doi)
+            try:
+                content = content_from_doi(pub.doi)
+            except AccessBlockedError:
+                content = None
             if content is None:
                 status = "Could not access DOI"
             else:
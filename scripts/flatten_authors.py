@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Flatten a CSV file of the authors of publications with a delimited list of
+affiliation IDs per author (e.g. '#EID_AUTHORS_wAFIDstring.csv' from the
+harvesting scripts) into one row per author and affiliation
+"""
+from argparse import ArgumentParser
+import pyarrow as pa
+import pyarrow.csv as csv
+from app.export import flatten_author_affiliations
+
+
+parser = ArgumentParser(__doc__)
+parser.add_argument('input', type=str,
+                    help="The CSV file of authors to flatten")
+parser.add_argument('output', type=str,
+                    help="The CSV file to write the flattened authors to")
+parser.add_argument('--column', type=str, default='AuthorAffIDList',
+                    help="The column containing the delimited affiliation IDs")
+parser.add_argument('--separator', type=str, default='_||_',
+                    help="The delimiter between the affiliation IDs")
+args = parser.parse_args()
+
+# Read all columns as strings so IDs are written back out unchanged
+with csv.open_csv(args.input) as reader:
+    columns = reader.schema.names
+authors = csv.read_csv(args.input, convert_options=csv.ConvertOptions(
+    column_types={c: pa.string() for c in columns}))
+csv.write_csv(flatten_author_affiliations(
+    authors, column=args.column, separator=args.separator), args.output)
@@ -2,21 +2,16 @@
 Search through publication content to search for likely terms
 """
 import os
-import re
 import csv
 import logging
 from argparse import ArgumentParser
 from datetime import datetime
 from app import app, db
 from app.models import Publication
+from app.reports import publications_query, stream
+from app.classify import classify_stored_many, default_scanner
 from app.constants import (
-    POSSIBLE_NIF_ASSOC, UNLIKELY_NIF_ASSOC, UNKNOWN_ACCESS_CONTENT,
-    PROBABLE_NIF_ASSOC)
-
-mri_re = re.compile(
-    r'(.{50}(?:MRI|(?:M|m)agnetic\s+(?:R|r)esonance\s+(?:I|i)maging).{50})')
-ge_re = re.compile(
-    r'(.{50}(?<!\w)(?:GE|G.E.|(?:G|g)eneral\s+(?:E|e)lectric)(?!\w).{50})')
+    POSSIBLE_NIF_ASSOC, UNKNOWN_ACCESS_CONTENT, PROBABLE_NIF_ASSOC)
 
 CSV_HEADERS = ['NIF Supported (Y/N)', 'Likelihood', 'Scopus ID', 'DOI',
                'Date', 'Authors', 'Journal', 'Title']
@@ -33,6 +28,13 @@ parser.add_argument('--possible_log', type=str, default=None,
                     help="Location of log file to output possible matches")
 parser.add_argument('--probable_log', type=str, default=None,
                     help="Location of log file to output probable matches")
+parser.add_argument('--jobs', type=int, default=1,
+                    help="Number of processes to classify publications with")
+parser.add_argument('--chunk_size', type=int, default=500,
+                    help="Number of classifications to save per transaction")
+parser.add_argument('--force', action='store_true', default=False,
+                    help=("Reclassify publications even if their content and "
+                          "the classification rules haven't changed"))
 args = parser.parse_args()
 
 probable_logger = logging.getLogger('nrt_probable')
@@ -58,55 +60,78 @@ if args.probable_log:
     handler.setFormatter(formatter)
     probable_logger.addHandler(handler)
 
+
+def log_classification(pub, likelihood, matches):
+    if likelihood == PROBABLE_NIF_ASSOC:
+        probable_logger.info(
+            ('%s: %s - PROBABLE:\n'
+             '  --- MRI ---\n    %s\n  --- GE ---\n    %s\n'),
+            pub.scopus_id,
+            pub.title,
+            '\n    '.join(matches['mri']),
+            '\n    '.join(matches['ge']))
+    elif likelihood == POSSIBLE_NIF_ASSOC:
+        possible_logger.info(
+            '%s: %s - POSSIBLE:\n    %s\n',
+            pub.scopus_id,
+            pub.title,
+            '\n    '.join(matches['mri']))
+    else:
+        other_logger.info(
+            '%s: %s - UNLIKELY',
+            pub.scopus_id,
+            pub.title)
+
+
 with app.app_context(), open(args.output_csv, 'w') as csv_f:
 
     csv_writer = csv.DictWriter(csv_f, CSV_HEADERS)
 
     csv_writer.writeheader()
 
-    query = (Publication.query
-             .filter(
-                Publication.date >= start_date,
-                Publication.date <= end_date))
-
-    for pub in query.all():
-        if pub.has_content:
-            mri_matches = mri_re.findall(pub.content)
-            if mri_matches:
-                ge_matches = ge_re.findall(pub.content)
-                if ge_matches:
-                    pub.nif_assoc = PROBABLE_NIF_ASSOC
-                    probable_logger.info(
-                        ('%s: %s - PROBABLE:\n'
-                         '  --- MRI ---\n    %s\n  --- GE ---\n    %s\n'),
-                        pub.scopus_id,
-                        pub.title,
-                        '\n    '.join(mri_matches),
-                        '\n    '.join(ge_matches))
-                else:
-                    pub.nif_assoc = POSSIBLE_NIF_ASSOC
-                    possible_logger.info(
-                        '%s: %s - POSSIBLE:\n    %s\n',
-                        pub.scopus_id,
-                        pub.title,
-                        '\n    '.join(mri_matches))
-            else:
-                pub.nif_assoc = UNLIKELY_NIF_ASSOC
-                other_logger.info(
-                    '%s: %s - UNLIKELY',
-                    pub.scopus_id,
-                    pub.title)
-        else:
-            pub.nif_assoc = UNKNOWN_ACCESS_CONTENT
+    query = publications_query(start_date, end_date, with_researchers=False)
+    pubs = {pub.id: pub for pub in query.all()}
+    rules_version = default_scanner().version
+    # Skip publications whose content has already been classified with the
+    # current rules (their nif_assoc may also have been manually updated since)
+    unchanged = set(
+        p.id for p in pubs.values()
+        if not args.force and p.has_content and p.is_classified(rules_version))
+    items = ((p.id, p.content_key) for p in pubs.values()
+             if p.has_content and p.id not in unchanged)
+
+    updates = []
+    classified = set(unchanged)
+    for pub_id, likelihood, matches, checksum in classify_stored_many(
+            items, jobs=args.jobs):
+        if likelihood is None:
+            continue
+        classified.add(pub_id)
+        log_classification(pubs[pub_id], likelihood, matches)
+        updates.append({'id': pub_id,
+                        'nif_assoc': likelihood,
+                        'classified_nif_assoc': likelihood,
+                        'classified_checksum': checksum,
+                        'classified_rules': rules_version})
+        if len(updates) >= args.chunk_size:
+            db.session.bulk_update_mappings(Publication, updates)
+            db.session.commit()
+            updates = []
+    for pub in pubs.values():
+        if pub.id not in classified:
             other_logger.info(
                 '%s: %s - UNKNOWN',
                 pub.scopus_id,
                 pub.title)
-        db.session.commit()
+            updates.append({'id': pub.id, 'nif_assoc': UNKNOWN_ACCESS_CONTENT})
+    db.session.bulk_update_mappings(Publication, updates)
+    db.session.commit()
+    print(f"Classified {len(classified) - len(unchanged)} publications, skipped "
+          f"{len(unchanged)} that were unchanged since they were last classified")
 
-    for pub in query.order_by(
+    for pub in stream(publications_query(start_date, end_date).order_by(
             Publication.nif_assoc.desc(),
-            Publication.date):
+            Publication.date)):
         csv_writer.writerow({
             'Scopus ID': pub.scopus_id,
             'DOI': ('https://dx.doi.org/' + pub.doi if pub.doi else ''),
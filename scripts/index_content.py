@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Record the availability, format, size and checksum of the content of every
+publication in the database from the content store (only needs to be run once
+for content downloaded before the content columns were added, or after the
+content store has been modified outside of the app)
+"""
+import sys
+from pathlib import Path
+from argparse import ArgumentParser
+
+sys.path.append(str(Path(__file__).parent.parent))
+from app import app, db  # noqa
+from app.models import Publication  # noqa
+from app.content_store import content_store  # noqa
+
+
+parser = ArgumentParser(__doc__)
+parser.add_argument(
+    "--all",
+    action="store_true",
+    default=False,
+    help="Re-index publications that have already been indexed",
+)
+args = parser.parse_args()
+
+with app.app_context():
+    query = Publication.query
+    if not args.all:
+        query = query.filter(Publication.content_available == None)  # noqa: E711
+    store = content_store()
+    num_indexed = num_available = 0
+    for pub in query.all():
+        content = store.read(pub.content_key)
+        pub.index_content(content)
+        num_indexed += 1
+        num_available += content is not None
+    db.session.commit()
+    print(f"Indexed {num_indexed} publications, {num_available} with content")
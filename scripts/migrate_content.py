@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Migrate downloaded publication content from one content store to another, e.g.
+from the original flat directory of uncompressed files to a compressed sharded
+directory
+"""
+import sys
+import os
+from pathlib import Path
+from argparse import ArgumentParser
+
+sys.path.append(str(Path(__file__).parent.parent))
+from app.content_store import create_content_store  # noqa
+
+
+parser = ArgumentParser(__doc__)
+parser.add_argument("source_dir", type=str, help="Directory of the existing store")
+parser.add_argument("dest_dir", type=str, help="Directory of the new store")
+parser.add_argument(
+    "--source-backend",
+    type=str,
+    default="file",
+    help="Backend of the existing store ('file', 'gzip' or 'zstd')",
+)
+parser.add_argument(
+    "--dest-backend",
+    type=str,
+    default="gzip",
+    help="Backend of the new store ('file', 'gzip' or 'zstd')",
+)
+parser.add_argument(
+    "--level", type=int, default=None, help="Compression level of the new store"
+)
+parser.add_argument(
+    "--delete",
+    action="store_true",
+    default=False,
+    help="Delete items from the existing store once they have been migrated",
+)
+args = parser.parse_args()
+
+source = create_content_store(args.source_backend, args.source_dir)
+kwargs = {"level": args.level} if args.dest_backend != "file" else {}
+dest = create_content_store(args.dest_backend, args.dest_dir, **kwargs)
+
+num_migrated = 0
+source_bytes = dest_bytes = 0
+for key in list(source.keys()):
+    dest.write(key, source.read(key))
+    source_bytes += os.path.getsize(source.path(key))
+    dest_bytes += os.path.getsize(dest.path(key))
+    if args.delete:
+        os.remove(source.path(key))
+    num_migrated += 1
+
+print(
+    f"Migrated {num_migrated} items from {args.source_dir} ({source_bytes} bytes) "
+    f"to {args.dest_dir} ({dest_bytes} bytes)"
+)
+print(
+    f"Set CONTENT_STORE = '{args.dest_backend}' and CONTENT_DIR = '{args.dest_dir}' "
+    "in config.py to use the new store"
+)